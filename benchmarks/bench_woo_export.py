@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the WooCommerce export loader on a wide WebToffee export.
+
+Generates a synthetic "all products" export with many unused columns and
+compares the column-projected loader (load_woo_export) with the previous
+loader that built a dictionary for every row.
+
+Two column layouts are measured:
+
+- ``webtoffee``: the layout of real WebToffee exports, with quoted multi-line
+  ``post_content``/``post_excerpt`` before ``sku`` and ``stock``, so every
+  record goes through the csv module fallback
+- ``compact``: the needed columns first and unquoted filler, the best case
+  for the partial split
+
+Usage:
+    python benchmarks/bench_woo_export.py [--products N] [--columns N] [--repeat N]
+                                          [--layout webtoffee|compact|both]
+"""
+
+import argparse
+import csv
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.woo_processor import load_woo_export  # noqa: E402
+from utils.file_utils import load_csv_file  # noqa: E402
+
+
+LAYOUTS = ('webtoffee', 'compact')
+
+# Product description as WebToffee exports it: HTML with commas, quotes and line breaks
+POST_CONTENT = ('<p>Lightweight running shoe, breathable "mesh" upper.</p>\n'
+                '<ul>\n<li>Weight: 250 g, drop 8 mm</li>\n<li>Sizes 38-46</li>\n</ul>')
+POST_EXCERPT = 'Running shoe, "mesh" upper'
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="WooCommerce export loader benchmark")
+    parser.add_argument("--products", type=int, default=10000,
+                        help="Number of parent products, each with 3 variations (default: 10000)")
+    parser.add_argument("--columns", type=int, default=200,
+                        help="Number of unused extra columns (default: 200)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of timed runs per loader, the best is reported (default: 3)")
+    parser.add_argument("--layout", choices=LAYOUTS + ('both',), default='both',
+                        help="Column layout of the export (default: both)")
+    return parser.parse_args()
+
+
+def write_export(file_path: Path, products: int, extra_columns: int, layout: str):
+    """Write a synthetic wide WebToffee export."""
+    extra = [f"meta:field_{i}" for i in range(extra_columns)]
+    filler = ["Lorem ipsum dolor sit amet, consectetur adipiscing elit."] * extra_columns
+    if layout == 'webtoffee':
+        header = ['ID', 'post_title', 'post_content', 'post_excerpt']
+        texts = [POST_CONTENT, POST_EXCERPT]
+    else:
+        header = ['ID', 'post_title']
+        texts = []
+
+    with open(file_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header + ['sku', 'ean', 'post_parent', 'stock', 'stock_status'] + extra)
+        row_id = 1
+        for i in range(products):
+            parent_id = row_id
+            writer.writerow([row_id, f"Product {i}"] + texts +
+                            [f"SKU{i}", '', '0', i % 20,
+                             'instock' if i % 20 else 'outofstock'] + filler)
+            row_id += 1
+            for j in range(3):
+                qty = (i + j) % 7
+                writer.writerow([row_id, f"Product {i} - {j}"] + texts +
+                                [f"SKU{i}-{j}", f"{i * 10 + j}.0", parent_id, f"{qty}.0",
+                                 'instock' if qty else 'outofstock'] + filler)
+                row_id += 1
+
+
+def load_woo_export_dict_rows(file_path: str) -> dict:
+    """Previous loader: full dictionary per row, repeated lookups and parsing."""
+    woo_products = {}
+    all_skus = set()
+
+    for row in load_csv_file(file_path):
+        if row.get('sku') and row['sku'].strip():
+            all_skus.add(row['sku'].strip())
+
+        if row.get('sku') and row['sku'].strip() and (not row.get('post_parent') or row['post_parent'] == '' or row['post_parent'] == '0'):
+            woo_products[f"sku_{row['sku'].strip()}"] = {
+                'sku': row['sku'].strip(),
+                'current_stock': int(float(row.get('stock', 0) or 0)),
+                'current_status': row.get('stock_status', 'outofstock'),
+                'type': 'parent'
+            }
+        elif row.get('ean') and row['ean'].strip() and row.get('post_parent') and row['post_parent'].strip():
+            ean = row['ean'].strip()
+            if ean.endswith('.0'):
+                ean = ean[:-2]
+            woo_products[f"ean_{ean}"] = {
+                'sku': row.get('sku', '').strip(),
+                'ean': ean,
+                'current_stock': int(float(row.get('stock', 0) or 0)),
+                'current_status': row.get('stock_status', 'outofstock'),
+                'type': 'variation',
+                'parent_id': row['post_parent']
+            }
+
+    woo_products['_all_skus'] = list(all_skus)
+    return woo_products
+
+
+def best_time(func, file_path: str, repeat: int):
+    """Return the best wall time of ``repeat`` runs and the last result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(file_path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_layout(layout: str, args):
+    """Benchmark both loaders on one export layout."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir) / "webtoffee_products_all.csv"
+        write_export(file_path, args.products, args.columns, layout)
+        size_mb = file_path.stat().st_size / (1024 * 1024)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            columns = len(f.readline().split(','))
+        print(f"Layout {layout}: {args.products * 4} rows, {columns} columns, {size_mb:.1f} MB")
+
+        dict_time, dict_result = best_time(load_woo_export_dict_rows, str(file_path), args.repeat)
+        fast_time, fast_result = best_time(load_woo_export, str(file_path), args.repeat)
+
+        dict_result['_all_skus'] = sorted(dict_result['_all_skus'])
+        fast_result['_all_skus'] = sorted(fast_result['_all_skus'])
+        if dict_result != fast_result:
+            print("ERROR: loaders returned different results")
+            sys.exit(1)
+
+    print(f"  Dict rows loader:        {dict_time:.3f}s")
+    print(f"  Column-projected loader: {fast_time:.3f}s")
+    print(f"  Speedup:                 {dict_time / fast_time:.2f}x")
+
+
+def main():
+    """Main function."""
+    args = parse_arguments()
+    layouts = LAYOUTS if args.layout == 'both' else (args.layout,)
+    for layout in layouts:
+        run_layout(layout, args)
+
+
+if __name__ == "__main__":
+    main()
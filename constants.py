@@ -10,11 +10,37 @@ load_dotenv()
 
 # B2B Feed Configuration
 B2B_FEED_URL = os.getenv("B2B_FEED_URL")
+# Optional delta feed with the products changed since the previous delta
+B2B_DELTA_FEED_URL = os.getenv("B2B_DELTA_FEED_URL")
+FEED_FULL_REFRESH_HOURS = float(os.getenv("FEED_FULL_REFRESH_HOURS", "24"))
 
 # File paths and directories
 DATA_DIR = Path(os.getenv("DATA_DIR", "./data"))
 DATA_DIR.mkdir(exist_ok=True)
 
+# Feed validation
+FEED_INDEX_FILE = DATA_DIR / "feed_index.json"
+FEED_MIN_COUNT_RATIO = float(os.getenv("FEED_MIN_COUNT_RATIO", "0.8"))
+FEED_MAX_ANOMALY_RATIO = float(os.getenv("FEED_MAX_ANOMALY_RATIO", "0.05"))
+FEED_ANOMALY_MIN_ITEMS = 100
+# Age after which the last good index is too stale to fall back to (0 = no limit)
+FEED_FALLBACK_MAX_AGE_HOURS = float(os.getenv("FEED_FALLBACK_MAX_AGE_HOURS", "48"))
+
+# Run checkpoints
+RUNS_DIR = DATA_DIR / "runs"
+LOCK_FILE = DATA_DIR / "sync.lock"
+
+# Sharded runs
+SHARDS_DIR = DATA_DIR / "shards"
+
+# Change journal
+JOURNAL_DIR = DATA_DIR / "journal"
+JOURNAL_KEEP_MONTHS = int(os.getenv("JOURNAL_KEEP_MONTHS", "6"))
+
+# Profiling
+PROFILES_DIR = DATA_DIR / "profiles"
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.01"))
+
 # Default input file
 DEFAULT_WOO_EXPORT = "webtoffee_products_all.csv"
 
@@ -27,4 +53,12 @@ STATUS_OUT_OF_STOCK = "outofstock"
 
 # Default stock management settings
 DEFAULT_MANAGE_STOCK = "yes"
-DEFAULT_BACKORDERS = "no"
\ No newline at end of file
+DEFAULT_BACKORDERS = "no"
+
+# Change suppression policies (0 / empty disables a policy)
+SUPPRESS_QTY_CAP = int(os.getenv("SUPPRESS_QTY_CAP", "0"))
+SUPPRESS_QTY_BUCKETS = [int(bound) for bound in os.getenv("SUPPRESS_QTY_BUCKETS", "").split(",")
+                        if bound.strip()]
+SUPPRESS_MIN_DELTA = int(os.getenv("SUPPRESS_MIN_DELTA", "0"))
+SUPPRESS_COOLDOWN_HOURS = float(os.getenv("SUPPRESS_COOLDOWN_HOURS", "0"))
+SUPPRESS_DROP_MAINTENANCE = os.getenv("SUPPRESS_DROP_MAINTENANCE", "no").lower() in ("1", "yes", "true")
\ No newline at end of file
@@ -1,27 +1,213 @@
 """
 B2B Feed processing module for WooCommerce Stock Sync application.
+
+The last validated feed is stored as an index of products. When a delta feed
+is configured, runs between full refreshes download only the products that
+changed and apply them on top of the stored index.
 """
+import os
 import xml.etree.ElementTree as ET
+from contextlib import nullcontext
 import requests
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 
-from constants import B2B_FEED_URL, DATA_DIR, STATUS_IN_STOCK, STATUS_OUT_OF_STOCK
+from constants import (
+    B2B_FEED_URL, B2B_DELTA_FEED_URL, FEED_FULL_REFRESH_HOURS, DATA_DIR,
+    STATUS_IN_STOCK, STATUS_OUT_OF_STOCK,
+    FEED_INDEX_FILE, FEED_MIN_COUNT_RATIO, FEED_MAX_ANOMALY_RATIO, FEED_ANOMALY_MIN_ITEMS,
+    FEED_FALLBACK_MAX_AGE_HOURS, SHARDS_DIR
+)
+from utils.checkpoint import RunCheckpoint, run_lock
+from utils.file_utils import save_json_file, load_json_file
 from utils.logger import logger
+from utils.profiler import StageProfiler, StageTimer
+from utils.shard import Shard, in_shard
+
+# Size of the chunks the feed is downloaded and parsed in
+FEED_CHUNK_SIZE = 1024 * 1024
+
+# Format version of the stored feed index
+FEED_INDEX_VERSION = 2
+
+
+class FeedValidationError(Exception):
+    """Raised when the B2B feed is truncated, malformed or implausible."""
+
+
+class FeedShrunkError(FeedValidationError):
+    """Raised when the B2B feed has considerably fewer products than the last good feed."""
+
+
+class FeedParser:
+    """
+    Incremental B2B feed parser.
+    
+    Chunks are parsed as they arrive and validated on the way: feeding stops
+    at the first XML error or as soon as too many stock items are malformed,
+    so a broken feed is rejected before it is downloaded completely.
+    """
+    
+    def __init__(self, shard: Optional[Shard] = None,
+                 variants: Optional[Dict[str, Dict[str, int]]] = None,
+                 timer: Optional[StageTimer] = None):
+        """
+        Args:
+            shard: Optional shard, only its products are kept (the whole
+                feed is still validated)
+            variants: Optional dictionary filled with the stock of each
+                variant (by EAN, '' for items without EAN) of each parent SKU
+            timer: Optional profiler timer accounting the parsing time
+        """
+        self.shard = shard
+        self.variants = variants
+        self.timer = timer or nullcontext()
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self.product_count = 0
+        self.item_count = 0
+        self.anomalies = 0
+        self._parser = ET.XMLPullParser(events=('end',))
+    
+    def feed(self, chunk: bytes):
+        """
+        Parse the next chunk of the feed.
+        
+        Raises:
+            FeedValidationError: If the feed is not valid XML or looks malformed
+        """
+        # Syntax errors are queued by feed() and raised by read_events()
+        try:
+            with self.timer:
+                self._parser.feed(chunk)
+                self._read_products()
+        except ET.ParseError as e:
+            raise FeedValidationError(f"Feed is not valid XML: {e}")
+        
+        # Stop early on a feed that is broken structurally
+        if (self.item_count >= FEED_ANOMALY_MIN_ITEMS and
+                self.anomalies / self.item_count > FEED_MAX_ANOMALY_RATIO):
+            raise FeedValidationError(
+                f"Feed looks malformed: {self.anomalies} invalid quantities "
+                f"in {self.item_count} items"
+            )
+    
+    def close(self, previous_count: Optional[int] = None,
+              delta: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Finish parsing and validate the feed as a whole.
+        
+        Args:
+            previous_count: Number of products in the last good feed, if known
+            delta: The feed is a delta feed, which may contain no products
+        
+        Returns:
+            Dictionary of products with stock information
+        
+        Raises:
+            FeedValidationError: If the feed is truncated or shrunk
+        """
+        try:
+            with self.timer:
+                self._parser.close()
+                self._read_products()
+        except ET.ParseError as e:
+            raise FeedValidationError(f"Feed is truncated: {e}")
+        
+        if self.product_count == 0 and not delta:
+            raise FeedValidationError("Feed contains no products")
+        
+        if previous_count and self.product_count < previous_count * FEED_MIN_COUNT_RATIO:
+            raise FeedShrunkError(
+                f"Feed shrunk from {previous_count} to {self.product_count} products"
+            )
+        
+        if self.anomalies:
+            logger.warning(f"Skipped {self.anomalies} stock items with invalid quantity")
+        logger.info(f"Parsed {len(self.products)} products/variants")
+        return self.products
+    
+    def _read_products(self):
+        """Process the products parsed so far."""
+        for _, product in self._parser.read_events():
+            if product.tag != 'product':
+                continue
+            self._add_product(product)
+            product.clear()
+    
+    def _add_product(self, product: ET.Element):
+        """Add a parent product and its variations."""
+        shard = self.shard
+        
+        # Parent product - SKU
+        mpn_elem = product.find('mpn')
+        if mpn_elem is None or not mpn_elem.text:
+            return
+        sku = mpn_elem.text.strip()
+        self.product_count += 1
+        
+        # Calculate total stock from all variants
+        total_stock = 0
+        stocks = {}
+        stock_elem = product.find('stock')
+        
+        if stock_elem is not None:
+            for item in stock_elem.findall('item'):
+                self.item_count += 1
+                try:
+                    qty = int(item.get('quantity', 0))
+                except ValueError:
+                    qty = -1
+                if qty < 0:
+                    # Skip the item rather than selling it out
+                    self.anomalies += 1
+                    continue
+                total_stock += qty
+                
+                # Variation - EAN
+                ean = item.get('ean', '').strip()
+                stocks[ean] = stocks.get(ean, 0) + qty
+                if ean and (shard is None or in_shard(f"ean_{ean}", shard)):
+                    self.products[f"ean_{ean}"] = {
+                        'type': 'variation',
+                        'ean': ean,
+                        'stock': qty,
+                        'stock_status': STATUS_IN_STOCK if qty > 0 else STATUS_OUT_OF_STOCK
+                    }
+        
+        if self.variants is not None:
+            self.variants[sku] = stocks
+        
+        # Save parent product
+        if shard is None or in_shard(f"sku_{sku}", shard):
+            self.products[f"sku_{sku}"] = {
+                'type': 'parent',
+                'sku': sku,
+                'stock': total_stock,
+                'stock_status': STATUS_IN_STOCK if total_stock > 0 else STATUS_OUT_OF_STOCK
+            }
 
 
-def download_feed(url: Optional[str] = None) -> bytes:
+def download_feed(url: Optional[str] = None, prefix: str = "b2b_feed",
+                  parser: Optional[FeedParser] = None) -> bytes:
     """
     Download XML feed from B2B supplier.
     
+    The feed is streamed and checked while downloading: a response that does
+    not look like XML or ends before its announced length is rejected. With
+    a parser, every chunk is parsed as soon as it arrives and the download is
+    aborted at the first error; the caller closes the parser afterwards.
+    
     Args:
         url: URL to download from, defaults to B2B_FEED_URL from constants
-        
+        prefix: File name prefix of the saved copy of the feed
+        parser: Optional parser to feed the downloaded chunks into
+    
     Returns:
         Raw XML content as bytes
-        
+    
     Raises:
+        FeedValidationError: If the feed is not XML, is truncated or fails parsing
         Exception: If download fails
     """
     feed_url = url or B2B_FEED_URL
@@ -30,90 +216,358 @@ def download_feed(url: Optional[str] = None) -> bytes:
     
     logger.info("Downloading B2B feed...")
     try:
-        response = requests.get(feed_url, timeout=300)
-        response.raise_for_status()
+        with requests.get(feed_url, timeout=300, stream=True) as response:
+            response.raise_for_status()
+            
+            chunks = []
+            try:
+                for chunk in response.iter_content(chunk_size=FEED_CHUNK_SIZE):
+                    if not chunks and not chunk.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'<'):
+                        raise FeedValidationError("Feed does not start with an XML document")
+                    chunks.append(chunk)
+                    if parser is not None:
+                        parser.feed(chunk)
+            except requests.exceptions.ChunkedEncodingError as e:
+                raise FeedValidationError(f"Feed download was cut off: {e}")
+            
+            content = b''.join(chunks)
+            expected_length = response.headers.get('Content-Length')
+            if (expected_length and expected_length.isdigit() and
+                    'Content-Encoding' not in response.headers and
+                    len(content) < int(expected_length)):
+                raise FeedValidationError(
+                    f"Feed is truncated: {len(content)} of {expected_length} bytes received"
+                )
         
         # Save for reference
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        feed_file = DATA_DIR / f"b2b_feed_{timestamp}.xml"
-        feed_file.write_bytes(response.content)
+        feed_file = DATA_DIR / f"{prefix}_{timestamp}.xml"
+        feed_file.write_bytes(content)
         logger.info(f"Feed downloaded: {feed_file.name}")
         
-        return response.content
+        return content
     except Exception as e:
         logger.error(f"Error downloading feed: {e}")
         raise
 
 
-def parse_b2b_feed(xml_content: bytes) -> Dict[str, Dict[str, Any]]:
+def parse_b2b_feed(xml_content: bytes,
+                   previous_count: Optional[int] = None,
+                   shard: Optional[Shard] = None,
+                   variants: Optional[Dict[str, Dict[str, int]]] = None,
+                   delta: bool = False) -> Dict[str, Dict[str, Any]]:
     """
-    Parse B2B feed XML and extract product data.
+    Parse B2B feed XML that is already downloaded.
     
     Args:
         xml_content: Raw XML content
-        
+        previous_count: Number of products in the last good feed, if known
+        shard: Optional shard, only its products are returned (the whole
+            feed is still validated)
+        variants: Optional dictionary filled with the variant stock of each parent SKU
+        delta: The content is a delta feed, which may contain no products
+    
     Returns:
         Dictionary of products with stock information
-        
+    
     Raises:
-        Exception: If parsing fails
+        FeedValidationError: If the feed is malformed, truncated or shrunk
     """
     logger.info("Parsing B2B feed...")
-    products = {}
-    
     try:
-        root = ET.fromstring(xml_content)
-        
-        for product in root.findall('.//product'):
-            # Parent product - SKU
-            mpn_elem = product.find('mpn')
-            if mpn_elem is not None and mpn_elem.text:
-                sku = mpn_elem.text.strip()
-                
-                # Calculate total stock from all variants
-                total_stock = 0
-                stock_elem = product.find('stock')
-                
-                if stock_elem is not None:
-                    for item in stock_elem.findall('item'):
-                        qty = int(item.get('quantity', 0))
-                        total_stock += qty
-                        
-                        # Variation - EAN
-                        ean = item.get('ean', '').strip()
-                        if ean:
-                            products[f"ean_{ean}"] = {
-                                'type': 'variation',
-                                'ean': ean,
-                                'stock': qty,
-                                'stock_status': STATUS_IN_STOCK if qty > 0 else STATUS_OUT_OF_STOCK
-                            }
-                
-                # Save parent product
-                products[f"sku_{sku}"] = {
-                    'type': 'parent',
-                    'sku': sku,
-                    'stock': total_stock,
-                    'stock_status': STATUS_IN_STOCK if total_stock > 0 else STATUS_OUT_OF_STOCK
-                }
-        
-        logger.info(f"Parsed {len(products)} products/variants")
-        return products
-        
+        parser = FeedParser(shard, variants)
+        for offset in range(0, len(xml_content), FEED_CHUNK_SIZE):
+            parser.feed(xml_content[offset:offset + FEED_CHUNK_SIZE])
+        return parser.close(previous_count, delta)
     except Exception as e:
         logger.error(f"Error parsing feed: {e}")
         raise
 
 
-def get_b2b_products(url: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+def save_last_good_index(products: Dict[str, Dict[str, Any]],
+                         variants: Dict[str, Dict[str, int]],
+                         last_full_at: Optional[str] = None) -> Path:
+    """
+    Store a validated feed index as the fallback for broken feeds and the
+    base for delta feeds.
+    
+    Args:
+        products: Dictionary of products with stock information
+        variants: Variant stock (by EAN) of each parent SKU
+        last_full_at: Time of the last full feed, now if None
+    
+    Returns:
+        Path to the stored index
+    """
+    saved_at = datetime.now().isoformat(timespec='seconds')
+    return save_json_file({
+        'version': FEED_INDEX_VERSION,
+        'saved_at': saved_at,
+        'last_full_at': last_full_at or saved_at,
+        'product_count': len(variants),
+        'products': products,
+        'variants': variants
+    }, FEED_INDEX_FILE)
+
+
+def load_last_good_index() -> Optional[Dict[str, Any]]:
+    """
+    Load the last validated feed index.
+    
+    Returns:
+        Dictionary with ``saved_at``, ``last_full_at``, ``product_count``,
+        ``products`` and ``variants``, None if no index was stored yet
+    """
+    return load_json_file(FEED_INDEX_FILE)
+
+
+def full_refresh_due(last_good: Optional[Dict[str, Any]]) -> bool:
+    """
+    Check whether the full feed has to be downloaded.
+    
+    Args:
+        last_good: Last validated feed index, None if there is none
+    
+    Returns:
+        True if no delta feed is configured, no usable index is stored or
+        the last full feed is older than FEED_FULL_REFRESH_HOURS
+    """
+    # Indexes stored by older versions lack the variant stock
+    if (not B2B_DELTA_FEED_URL or not last_good or
+            last_good.get('version') != FEED_INDEX_VERSION):
+        return True
+    last_full_at = datetime.fromisoformat(last_good['last_full_at'])
+    return datetime.now() - last_full_at >= timedelta(hours=FEED_FULL_REFRESH_HOURS)
+
+
+def apply_delta(index: Dict[str, Any],
+                delta_products: Dict[str, Dict[str, Any]],
+                delta_variants: Dict[str, Dict[str, int]]) -> int:
+    """
+    Apply a parsed delta feed to a feed index in place.
+    
+    Variant stock from the delta is merged into the stored variants of each
+    changed product; variants the delta does not list (or lists with an
+    invalid quantity) keep their stored stock. Parent totals are then
+    recomputed from the index for the changed products only. A variant that
+    moved to another product is removed from its previous product.
+    
+    Args:
+        index: Feed index with ``products`` and ``variants``
+        delta_products: Products parsed from the delta feed
+        delta_variants: Variant stock of each parent SKU in the delta feed
+    
+    Returns:
+        Number of parent products whose total was recomputed
+    """
+    products = index['products']
+    variants = index['variants']
+    changed = set(delta_variants)
+    
+    # Looking up the previous product of new EANs needs a scan of the index,
+    # which is only done when a delta introduces EANs
+    new_eans = {ean: sku for sku, stocks in delta_variants.items() for ean in stocks
+                if ean and ean not in variants.get(sku, {})}
+    if new_eans:
+        for owner, stocks in variants.items():
+            for ean in [ean for ean in stocks if new_eans.get(ean, owner) != owner]:
+                del stocks[ean]
+                changed.add(owner)
+    
+    for sku, stocks in delta_variants.items():
+        variants.setdefault(sku, {}).update(stocks)
+    products.update(delta_products)
+    
+    for sku in changed:
+        total_stock = sum(variants[sku].values())
+        products[f"sku_{sku}"] = {
+            'type': 'parent',
+            'sku': sku,
+            'stock': total_stock,
+            'stock_status': STATUS_IN_STOCK if total_stock > 0 else STATUS_OUT_OF_STOCK
+        }
+    
+    index['product_count'] = len(variants)
+    return len(changed)
+
+
+def _get_delta_products(last_good: Dict[str, Any],
+                        profiler: StageProfiler) -> Dict[str, Dict[str, Any]]:
+    """
+    Download the delta feed and apply it on top of the last good index.
+    
+    Raises:
+        FeedValidationError: If the delta feed is invalid
+    """
+    delta_variants = {}
+    with profiler.substage("parse_delta_feed") as parse_timer:
+        parser = FeedParser(variants=delta_variants, timer=parse_timer)
+        with profiler.stage("download_delta_feed"):
+            download_feed(B2B_DELTA_FEED_URL, prefix="b2b_delta", parser=parser)
+            delta_products = parser.close(delta=True)
+    
+    with profiler.stage("apply_delta_feed"):
+        recomputed = apply_delta(last_good, delta_products, delta_variants)
+        logger.info(f"Applied delta feed: {len(delta_variants)} products changed, "
+                    f"{recomputed} parent totals recomputed")
+        save_last_good_index(last_good['products'], last_good['variants'],
+                             last_good['last_full_at'])
+    return last_good['products']
+
+
+def _download_full_feed(url: Optional[str],
+                        previous_count: Optional[int],
+                        profiler: StageProfiler) -> Tuple[Dict[str, Dict[str, Any]], bytes]:
+    """
+    Download and parse the whole full feed and store it as the last good index.
+    
+    Returns:
+        Tuple with all products of the feed and the raw XML content
+    
+    Raises:
+        FeedValidationError: If the feed is invalid
+    """
+    variants = {}
+    # The feed is parsed while it downloads, parsing is accounted separately
+    with profiler.substage("parse_b2b_feed") as parse_timer:
+        parser = FeedParser(variants=variants, timer=parse_timer)
+        with profiler.stage("download_feed"):
+            xml_content = download_feed(url, parser=parser)
+            products = parser.close(previous_count)
+    save_last_good_index(products, variants)
+    return products, xml_content
+
+
+def _shard_products(products: Dict[str, Dict[str, Any]],
+                    shard: Optional[Shard]) -> Dict[str, Dict[str, Any]]:
+    """Return the products of one shard, all products without a shard."""
+    if shard is None:
+        return products
+    return {key: product for key, product in products.items() if in_shard(key, shard)}
+
+
+def _get_shared_feed_products(run_id: str,
+                             url: Optional[str],
+                             previous_count: Optional[int],
+                             shard: Shard,
+                             profiler: StageProfiler) -> Dict[str, Dict[str, Any]]:
+    """
+    Parse the full feed for one shard, downloading it once for all shards.
+    
+    The first shard of a run downloads and validates the whole feed, stores
+    it as the last good index and keeps the feed, or the reason it was
+    rejected, under ``SHARDS_DIR/<run_id>/``. The other shards wait for it
+    and parse the same snapshot, so all shard results are diffed against
+    one feed.
+    
+    Raises:
+        FeedValidationError: If the feed is invalid
+    """
+    feed_dir = SHARDS_DIR / run_id
+    feed_dir.mkdir(parents=True, exist_ok=True)
+    feed_file = feed_dir / "feed.xml"
+    rejected_file = feed_dir / "feed.rejected"
+    
+    with run_lock(run_id, feed_dir / "feed.lock", wait=True):
+        rejected = load_json_file(rejected_file)
+        if rejected is not None:
+            error = FeedShrunkError if rejected['shrunk'] else FeedValidationError
+            raise error(rejected['error'])
+        if feed_file.exists():
+            logger.info(f"Using the feed downloaded by another shard: {feed_file}")
+            with profiler.stage("parse_b2b_feed"):
+                return parse_b2b_feed(feed_file.read_bytes(), previous_count, shard)
+        
+        try:
+            products, xml_content = _download_full_feed(url, previous_count, profiler)
+        except FeedValidationError as e:
+            save_json_file({'error': str(e), 'shrunk': isinstance(e, FeedShrunkError)},
+                           rejected_file)
+            raise
+        
+        tmp_file = feed_file.with_name(feed_file.name + ".tmp")
+        tmp_file.write_bytes(xml_content)
+        os.replace(tmp_file, feed_file)
+        return _shard_products(products, shard)
+
+
+def get_b2b_products(url: Optional[str] = None,
+                     profiler: Optional[StageProfiler] = None,
+                     checkpoint: Optional[RunCheckpoint] = None,
+                     shard: Optional[Shard] = None,
+                     full_refresh: bool = False,
+                     accept_feed: bool = False,
+                     run_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
     """
     Download and parse B2B feed in one step.
     
+    A feed that fails validation is replaced with the last known-good index,
+    so a broken feed does not turn into a mass import. A full feed is always
+    parsed and stored as the last known-good index as a whole, sharded runs
+    then keep only the products of their shard. An index
+    older than FEED_FALLBACK_MAX_AGE_HOURS is not used, the run fails instead
+    of importing stale stock.
+    
+    When a delta feed is configured, unsharded runs apply it on top of the
+    last good index and download the full feed only every
+    FEED_FULL_REFRESH_HOURS. Sharded runs always use the full feed, which
+    is downloaded once and shared by all shards with the same run ID.
+    
     Args:
         url: Optional URL to download from
-        
+        profiler: Optional profiler for the download and parse stages
+        checkpoint: Optional run checkpoint to resume from and save stages to
+        shard: Optional shard, only its products are returned
+        full_refresh: Download the full feed even if a delta feed would do
+        accept_feed: Accept a full feed whose product count dropped, e.g.
+            after the supplier shrunk the catalog
+        run_id: Identifier of the run, shards of a run share the feed download
+    
     Returns:
         Dictionary of products with stock information
+    
+    Raises:
+        FeedValidationError: If the feed is invalid and no usable fallback index exists
     """
-    xml_content = download_feed(url)
-    return parse_b2b_feed(xml_content)
\ No newline at end of file
+    profiler = profiler or StageProfiler(None, "")
+    
+    if checkpoint:
+        products = checkpoint.load("b2b_products")
+        if products is not None:
+            return products
+    
+    last_good = load_last_good_index()
+    previous_count = last_good['product_count'] if last_good else None
+    if accept_feed:
+        logger.info("Accepting the feed without comparing its product count")
+        previous_count = None
+    use_delta = (shard is None and not full_refresh and not accept_feed and
+                 not full_refresh_due(last_good))
+    
+    try:
+        if use_delta:
+            # The index is only updated once the delta feed is validated
+            products = _get_delta_products(last_good, profiler)
+        elif shard is not None and run_id:
+            products = _get_shared_feed_products(run_id, url, previous_count, shard, profiler)
+        else:
+            products, _ = _download_full_feed(url, previous_count, profiler)
+            products = _shard_products(products, shard)
+    except FeedValidationError as e:
+        if not last_good:
+            raise
+        saved_at = datetime.fromisoformat(last_good['saved_at'])
+        if (FEED_FALLBACK_MAX_AGE_HOURS and
+                datetime.now() - saved_at > timedelta(hours=FEED_FALLBACK_MAX_AGE_HOURS)):
+            message = (f"{e}; the last good feed index from {last_good['saved_at']} "
+                       f"is older than {FEED_FALLBACK_MAX_AGE_HOURS:g} hours")
+            if isinstance(e, FeedShrunkError):
+                message += ". Check the feed and rerun with --accept-feed if the change is expected"
+            raise type(e)(message)
+        logger.warning(f"Rejected B2B feed: {e}")
+        logger.warning(f"Falling back to the last good feed index from {last_good['saved_at']}")
+        products = _shard_products(last_good['products'], shard)
+    
+    if checkpoint:
+        checkpoint.save("b2b_products", products)
+    return products
\ No newline at end of file
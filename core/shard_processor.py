@@ -0,0 +1,141 @@
+"""
+Shard processing module for WooCommerce Stock Sync application.
+
+A sharded run (``--shard i/N``) only handles the products whose key hashes
+to its shard, so a large catalogue can be split across processes or nodes.
+Each shard stores its change set under ``DATA_DIR/shards/<run_id>/`` instead
+of writing an import file; ``merge_shards.py`` combines the results of all
+shards into one import file and journal entry per store.
+"""
+import shutil
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from constants import SHARDS_DIR, IMPORT_FIELDNAMES
+from core.sync_processor import create_import_file
+from utils.file_utils import save_json_file, load_json_file
+from utils.logger import logger
+from utils.shard import Shard, shard_tag
+
+
+def _result_name(store: Optional[str], shard: Shard) -> str:
+    """Return the file name of a shard result."""
+    return f"{store or 'default'}.{shard_tag(shard)}.json"
+
+
+def save_shard_result(run_id: str,
+                      shard: Shard,
+                      store: Optional[str],
+                      changeset: Dict[str, Any]) -> Path:
+    """
+    Store the change set of one store computed by one shard.
+
+    Args:
+        run_id: Identifier of the run shared by all shards
+        shard: Tuple with the shard index and the number of shards
+        store: Optional store name
+        changeset: Dictionary with ``skus``, ``changes``, ``log_data`` and ``stats``
+
+    Returns:
+        Path to the stored result
+    """
+    result_dir = SHARDS_DIR / run_id
+    result_dir.mkdir(parents=True, exist_ok=True)
+    result = dict(changeset, store=store, shard=list(shard))
+    result_file = save_json_file(result, result_dir / _result_name(store, shard))
+    logger.info(f"Shard result saved: {result_file}")
+    return result_file
+
+
+def _load_shard_results(run_id: str) -> Dict[Optional[str], List[Dict[str, Any]]]:
+    """
+    Load all shard results of a run grouped by store.
+
+    Raises:
+        ValueError: If there are no results or some shards are missing
+    """
+    result_dir = SHARDS_DIR / run_id
+    result_files = sorted(result_dir.glob("*.json")) if result_dir.exists() else []
+    if not result_files:
+        raise ValueError(f"No shard results found for run {run_id}")
+
+    results = {}
+    for result_file in result_files:
+        result = load_json_file(result_file)
+        results.setdefault(result['store'], []).append(result)
+
+    for store, store_results in results.items():
+        counts = {result['shard'][1] for result in store_results}
+        if len(counts) > 1:
+            raise ValueError(f"Shard results of store {store or 'default'} "
+                             f"use different shard counts: {sorted(counts)}")
+        count = counts.pop()
+        done = {result['shard'][0] for result in store_results}
+        missing = [str(index) for index in range(count) if index not in done]
+        if missing:
+            raise ValueError(f"Run {run_id} is missing results of shards "
+                             f"{', '.join(missing)} of {count} for store {store or 'default'}")
+        store_results.sort(key=lambda result: result['shard'][0])
+
+    return results
+
+
+def merge_shard_results(run_id: str, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """
+    Merge the results of all shards of a run.
+
+    Changes of all shards are concatenated per store; maintenance rows of a
+    SKU whose rows fall into several shards are emitted only once. The import
+    file and the journal entry are written once per store, then the shard
+    results are removed.
+
+    Args:
+        run_id: Identifier of the run shared by all shards
+        dry_run: Only report the merged changes, keep the shard results
+
+    Returns:
+        List of store sync summaries
+
+    Raises:
+        ValueError: If there are no results or some shards are missing
+    """
+    results = _load_shard_results(run_id)
+    summaries = []
+
+    for store, store_results in results.items():
+        changes = []
+        seen = set()
+        log_data = []
+        stats = {}
+        skus = 0
+        for result in store_results:
+            for change in result['changes']:
+                row = tuple(change.get(field) for field in IMPORT_FIELDNAMES)
+                if row in seen:
+                    continue
+                seen.add(row)
+                changes.append(change)
+            log_data.extend(result['log_data'])
+            for name, count in result['stats'].items():
+                stats[name] = stats.get(name, 0) + count
+            skus += result['skus']
+
+        logger.info(f"Merging {len(store_results)} shards of store {store or 'default'}: "
+                    f"{len(changes)} import rows")
+        import_file = None
+        if not dry_run:
+            import_file = create_import_file(changes, log_data, run_id, store)
+
+        summaries.append({
+            'name': store,
+            'file': None,
+            'skus': skus,
+            'changes': len(changes),
+            'stock_changes': len(log_data),
+            'suppressed': stats,
+            'import_file': str(import_file) if import_file else None
+        })
+
+    if not dry_run:
+        shutil.rmtree(SHARDS_DIR / run_id, ignore_errors=True)
+    return summaries
@@ -0,0 +1,254 @@
+"""
+Multi-store processing module for WooCommerce Stock Sync application.
+
+The B2B feed is parsed once and every WooCommerce store export is diffed
+against it in its own worker process. Workers share the parsed feed index
+read-only: with the ``fork`` start method it is inherited copy-on-write,
+otherwise it is sent to each worker once when the worker starts.
+"""
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from constants import PROFILES_DIR
+from core.woo_processor import load_woo_export
+from core.sync_processor import detect_changes, create_import_file
+from core.shard_processor import save_shard_result
+from core.suppression import log_suppression_stats, prepare_policy
+from utils.checkpoint import RunCheckpoint
+from utils.logger import logger
+from utils.profiler import StageProfiler
+from utils.shard import Shard
+
+# Parsed B2B feed shared with worker processes
+_shared_b2b_products: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+def load_store_config(config_path: str) -> List[Dict[str, Any]]:
+    """
+    Load store definitions from a JSON config file.
+
+    The file contains a list of stores, each with a ``name`` and the ``file``
+    of its WooCommerce export, e.g.::
+
+        [{"name": "shop_cz", "file": "exports/shop_cz.csv"}]
+
+    Relative export paths are resolved against the config file directory.
+
+    Args:
+        config_path: Path to the JSON config file
+
+    Returns:
+        List of store definitions
+
+    Raises:
+        ValueError: If the config is not a list of stores with unique names
+    """
+    config_dir = Path(config_path).parent
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    if not isinstance(config, list):
+        raise ValueError(f"Store config {config_path} must contain a list of stores")
+
+    stores = []
+    for entry in config:
+        if not entry.get('name') or not entry.get('file'):
+            raise ValueError(f"Store config entry {entry} needs 'name' and 'file'")
+        file_path = Path(entry['file'])
+        if not file_path.is_absolute():
+            file_path = config_dir / file_path
+        stores.append({'name': entry['name'], 'file': str(file_path)})
+
+    _check_unique_names(stores)
+    return stores
+
+
+def stores_from_files(file_paths: List[str]) -> List[Dict[str, Any]]:
+    """
+    Create store definitions from a list of export files.
+
+    A single export keeps the unnamed single-store behaviour, several exports
+    are named after their file names.
+
+    Args:
+        file_paths: Paths to WooCommerce export CSV files
+
+    Returns:
+        List of store definitions
+    """
+    if len(file_paths) == 1:
+        return [{'name': None, 'file': file_paths[0]}]
+
+    stores = [{'name': Path(file_path).stem, 'file': file_path} for file_path in file_paths]
+    _check_unique_names(stores)
+    return stores
+
+
+def _check_unique_names(stores: List[Dict[str, Any]]):
+    """Make sure import files of different stores cannot collide."""
+    names = [store['name'] for store in stores]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate store names: {', '.join(duplicates)}")
+
+
+def sync_store(b2b_products: Dict[str, Dict[str, Any]],
+               store: Dict[str, Any],
+               run_id: str,
+               profiler: Optional[StageProfiler] = None,
+               policy: Optional[Dict[str, Any]] = None,
+               dry_run: bool = False,
+               checkpoint: Optional[RunCheckpoint] = None,
+               shard: Optional[Shard] = None) -> Dict[str, Any]:
+    """
+    Synchronize one store against the parsed B2B feed.
+
+    A sharded sync saves its change set as a shard result instead of writing
+    the import file and journal, which is done when the shards are merged.
+
+    Args:
+        b2b_products: Dictionary of B2B products with stock information
+        store: Store definition with ``name`` and ``file``
+        run_id: Identifier of the run
+        profiler: Optional profiler for the store stages
+        policy: Optional suppression policy settings
+        dry_run: Only detect changes, do not write the import file and journal
+        checkpoint: Optional run checkpoint to resume from and save stages to
+        shard: Optional shard, only its products are synchronized
+
+    Returns:
+        Summary of the store sync
+    """
+    profiler = profiler or StageProfiler(None, run_id)
+    suffix = f"_{store['name']}" if store['name'] else ""
+
+    summary = checkpoint.load(f"summary{suffix}") if checkpoint else None
+    if summary is not None:
+        return summary
+
+    changeset = checkpoint.load(f"changes{suffix}") if checkpoint else None
+    if changeset is None:
+        woo_products = checkpoint.load(f"woo_products{suffix}") if checkpoint else None
+        if woo_products is None:
+            with profiler.stage("load_woo_export"):
+                woo_products = load_woo_export(store['file'], shard)
+            if checkpoint:
+                checkpoint.save(f"woo_products{suffix}", woo_products)
+
+        stats = {}
+        with profiler.stage("detect_changes"):
+            if policy:
+                policy = prepare_policy(policy, store['name'])
+            changes, log_data = detect_changes(b2b_products, woo_products, policy, stats)
+
+        changeset = {
+            'skus': len(woo_products.get('_all_skus', [])),
+            'changes': changes,
+            'log_data': log_data,
+            'stats': stats
+        }
+        if checkpoint:
+            checkpoint.save(f"changes{suffix}", changeset)
+
+    changes, log_data, stats = changeset['changes'], changeset['log_data'], changeset['stats']
+    log_suppression_stats(stats, len(changes))
+
+    import_file = None
+    shard_result = None
+    if not dry_run and shard:
+        shard_result = save_shard_result(run_id, shard, store['name'], changeset)
+    elif not dry_run:
+        with profiler.stage("create_import_file"):
+            import_file = create_import_file(changes, log_data, run_id, store['name'])
+
+    summary = {
+        'name': store['name'],
+        'file': store['file'],
+        'skus': changeset['skus'],
+        'changes': len(changes),
+        'stock_changes': len(log_data),
+        'suppressed': stats,
+        'import_file': str(import_file) if import_file else None,
+        'shard_result': str(shard_result) if shard_result else None
+    }
+    if checkpoint:
+        checkpoint.save(f"summary{suffix}", summary)
+    return summary
+
+
+def _init_worker(b2b_products: Dict[str, Dict[str, Any]]):
+    """Receive the parsed B2B feed in a worker process."""
+    global _shared_b2b_products
+    _shared_b2b_products = b2b_products
+
+
+def _sync_store_worker(store: Dict[str, Any], run_id: str,
+                       profile_mode: Optional[str],
+                       policy: Optional[Dict[str, Any]],
+                       dry_run: bool,
+                       checkpoint: Optional[RunCheckpoint],
+                       shard: Optional[Shard]) -> Dict[str, Any]:
+    """Synchronize one store inside a worker process."""
+    profiler = StageProfiler(profile_mode, store['name'], PROFILES_DIR / run_id)
+    summary = sync_store(_shared_b2b_products, store, run_id, profiler, policy, dry_run,
+                         checkpoint, shard)
+    profiler.write_summary()
+    return summary
+
+
+def sync_stores(b2b_products: Dict[str, Dict[str, Any]],
+                stores: List[Dict[str, Any]],
+                run_id: str,
+                workers: Optional[int] = None,
+                profile_mode: Optional[str] = None,
+                policy: Optional[Dict[str, Any]] = None,
+                dry_run: bool = False,
+                checkpoint: Optional[RunCheckpoint] = None,
+                shard: Optional[Shard] = None) -> List[Dict[str, Any]]:
+    """
+    Synchronize several stores against one parsed B2B feed in parallel.
+
+    Args:
+        b2b_products: Dictionary of B2B products with stock information
+        stores: List of store definitions
+        run_id: Identifier of the run
+        workers: Number of worker processes, defaults to one per store up to the CPU count
+        profile_mode: Optional profile mode for the store stages
+        policy: Optional suppression policy settings
+        dry_run: Only detect changes, do not write import files and journal
+        checkpoint: Optional run checkpoint to resume from and save stages to
+        shard: Optional shard, only its products are synchronized
+
+    Returns:
+        List of store sync summaries in the order of ``stores``
+    """
+    global _shared_b2b_products
+    workers = workers or min(len(stores), os.cpu_count() or 1)
+    logger.info(f"Synchronizing {len(stores)} stores with {workers} workers")
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # Forked workers inherit the feed index without copying it
+        _shared_b2b_products = b2b_products
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork')
+        )
+    else:
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(b2b_products,)
+        )
+
+    try:
+        with executor:
+            futures = [executor.submit(_sync_store_worker, store, run_id, profile_mode,
+                                       policy, dry_run, checkpoint, shard)
+                       for store in stores]
+            return [future.result() for future in futures]
+    finally:
+        _shared_b2b_products = None
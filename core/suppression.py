@@ -0,0 +1,194 @@
+"""
+Change suppression module for WooCommerce Stock Sync application.
+
+Every row in the import file costs a WooCommerce product save. Suppression
+policies drop quantity-only changes that do not matter to customers:
+
+- ``qty_cap``: quantities above the cap are shown as the cap, so moves
+  between two values above the cap are dropped
+- ``qty_buckets``: moves within the same quantity bucket are dropped
+- ``min_delta``: moves smaller than the minimum delta are dropped
+- ``cooldown``: products that changed within the cooldown are not updated again
+- ``drop_maintenance``: SKUs missing from the feed are not re-emitted with
+  their current values
+
+A change of stock status (in stock / out of stock) is never suppressed.
+
+Suppression statistics count the combined number of suppressed rows under
+``total`` and, for every policy, the rows that policy would suppress if it
+were the only one configured; the policies overlap, so their counts do not
+add up to the total.
+"""
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from constants import (
+    SUPPRESS_QTY_CAP, SUPPRESS_QTY_BUCKETS, SUPPRESS_MIN_DELTA,
+    SUPPRESS_COOLDOWN_HOURS, SUPPRESS_DROP_MAINTENANCE
+)
+from utils.journal import get_recent_change_keys
+from utils.logger import logger
+
+POLICY_NAMES = ('qty_cap', 'qty_buckets', 'min_delta', 'cooldown', 'drop_maintenance')
+
+
+def load_suppression_policy() -> Dict[str, Any]:
+    """
+    Load suppression policy settings from the configuration.
+
+    Returns:
+        Dictionary with the policy settings
+    """
+    return {
+        'qty_cap': SUPPRESS_QTY_CAP,
+        'qty_buckets': sorted(SUPPRESS_QTY_BUCKETS),
+        'min_delta': SUPPRESS_MIN_DELTA,
+        'cooldown_hours': SUPPRESS_COOLDOWN_HOURS,
+        'drop_maintenance': SUPPRESS_DROP_MAINTENANCE
+    }
+
+
+def prepare_policy(policy: Dict[str, Any], store: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Resolve run-specific data needed by the policies.
+
+    The cooldown policy needs the products that changed recently, which are
+    looked up in the change journal.
+
+    Args:
+        policy: Policy settings
+        store: Optional store name for the journal lookup
+
+    Returns:
+        Copy of the policy settings with run-specific data added
+    """
+    policy = dict(policy)
+    if policy.get('cooldown_hours'):
+        since = datetime.now() - timedelta(hours=policy['cooldown_hours'])
+        policy['recent_keys'] = get_recent_change_keys(since, store)
+        logger.info(f"Cooldown: {len(policy['recent_keys'])} products changed "
+                    f"in the last {policy['cooldown_hours']:g} hours")
+    return policy
+
+
+def capped_stock(stock: int, policy: Optional[Dict[str, Any]]) -> int:
+    """
+    Apply the quantity cap to a stock value.
+
+    Args:
+        stock: Stock quantity
+        policy: Policy settings, None if suppression is disabled
+
+    Returns:
+        Stock quantity to import
+    """
+    if policy and policy.get('qty_cap'):
+        return min(stock, policy['qty_cap'])
+    return stock
+
+
+def suppression_reason(key: str, old_stock: int, new_stock: int,
+                       policy: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Decide whether a quantity-only change should be suppressed.
+
+    Must only be called for changes that keep the stock status.
+
+    Args:
+        key: Product key (``sku_<SKU>`` / ``ean_<EAN>``)
+        old_stock: Current stock in WooCommerce
+        new_stock: Stock from the B2B feed
+        policy: Policy settings, None if suppression is disabled
+
+    Returns:
+        Name of the policy that suppresses the change, None to emit it
+    """
+    if not policy:
+        return None
+
+    cap = policy.get('qty_cap')
+    if cap:
+        # Stock above the cap in WooCommerce is brought down to the cap once
+        if old_stock > cap:
+            return None
+        new_stock = capped_stock(new_stock, policy)
+        if new_stock == old_stock:
+            return 'qty_cap'
+
+    buckets = policy.get('qty_buckets')
+    if buckets and bisect_right(buckets, old_stock) == bisect_right(buckets, new_stock):
+        return 'qty_buckets'
+
+    if policy.get('min_delta') and abs(new_stock - old_stock) < policy['min_delta']:
+        return 'min_delta'
+
+    if key in policy.get('recent_keys', ()):
+        return 'cooldown'
+
+    return None
+
+
+def suppressing_policies(key: str, old_stock: int, new_stock: int,
+                         policy: Optional[Dict[str, Any]]) -> List[str]:
+    """
+    List the policies that would suppress a quantity-only change on their own.
+
+    Each policy is evaluated as if it were the only one configured, so a row
+    can be counted by several policies, and a policy can match a row that the
+    combined policy still emits (e.g. stock above the cap being brought down).
+
+    Args:
+        key: Product key (``sku_<SKU>`` / ``ean_<EAN>``)
+        old_stock: Current stock in WooCommerce
+        new_stock: Stock from the B2B feed
+        policy: Policy settings, None if suppression is disabled
+
+    Returns:
+        Names of the policies that suppress the change on their own
+    """
+    if not policy:
+        return []
+
+    names = []
+    for name, setting in (('qty_cap', 'qty_cap'), ('qty_buckets', 'qty_buckets'),
+                          ('min_delta', 'min_delta'), ('cooldown', 'recent_keys')):
+        if policy.get(setting) and suppression_reason(key, old_stock, new_stock,
+                                                      {setting: policy[setting]}):
+            names.append(name)
+    return names
+
+
+def count_suppression(stats: Dict[str, int], policies: List[str], suppressed: bool):
+    """
+    Count one row in the suppression statistics.
+
+    Args:
+        stats: Suppression statistics to update
+        policies: Policies that would suppress the row on their own
+        suppressed: Whether the combined policy suppresses the row
+    """
+    if suppressed:
+        stats['total'] = stats.get('total', 0) + 1
+    for name in policies:
+        stats[name] = stats.get(name, 0) + 1
+
+
+def log_suppression_stats(stats: Dict[str, int], emitted: int):
+    """
+    Log how many import rows the policies saved together and each alone.
+
+    Args:
+        stats: Suppression statistics (see count_suppression)
+        emitted: Number of rows in the import
+    """
+    if not any(stats.values()):
+        return
+
+    saved = stats.get('total', 0)
+    total = saved + emitted
+    logger.info(f"Suppression saved {saved} of {total} import rows "
+                f"({saved / total:.1%})")
+    for name in POLICY_NAMES:
+        if stats.get(name):
+            logger.info(f"  {name} alone: {stats[name]} rows ({stats[name] / total:.1%})")
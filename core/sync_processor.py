@@ -5,18 +5,27 @@ from typing import Dict, Any, List, Tuple, Optional
 from datetime import datetime
 
 from constants import DEFAULT_MANAGE_STOCK, DEFAULT_BACKORDERS
-from utils.file_utils import save_csv_file, save_log_file
+from core.suppression import (
+    capped_stock, count_suppression, suppressing_policies, suppression_reason
+)
+from utils.file_utils import make_run_id, save_csv_file
+from utils.journal import append_changes
 from utils.logger import logger
 
 
 def detect_changes(b2b_products: Dict[str, Dict[str, Any]],
-                  woo_products: Dict[str, Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+                  woo_products: Dict[str, Dict[str, Any]],
+                  policy: Optional[Dict[str, Any]] = None,
+                  stats: Optional[Dict[str, int]] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
     """
     Compare B2B and WooCommerce data to detect stock changes.
     
     Args:
         b2b_products: Dictionary of B2B products with stock information
         woo_products: Dictionary of WooCommerce products with current stock information
+        policy: Optional suppression policy settings (see core.suppression)
+        stats: Optional dictionary filled with suppression statistics
+            (see core.suppression.count_suppression)
         
     Returns:
         Tuple containing:
@@ -26,6 +35,7 @@ def detect_changes(b2b_products: Dict[str, Dict[str, Any]],
     logger.info("Comparing data and detecting changes...")
     changes = []
     change_log = []
+    stats = stats if stats is not None else {}
     
     # Get all SKUs from WooCommerce export
     all_skus = woo_products.get('_all_skus', [])
@@ -51,20 +61,32 @@ def detect_changes(b2b_products: Dict[str, Dict[str, Any]],
             if (woo_data['current_stock'] != b2b_data['stock'] or
                 woo_data['current_status'] != b2b_data['stock_status']):
                 
+                # Quantity-only changes may be suppressed by policy
+                if woo_data['current_status'] == b2b_data['stock_status']:
+                    old_stock, new_stock = woo_data['current_stock'], b2b_data['stock']
+                    suppressed = suppression_reason(key, old_stock, new_stock, policy) is not None
+                    count_suppression(stats, suppressing_policies(key, old_stock, new_stock, policy),
+                                      suppressed)
+                    if suppressed:
+                        continue
+                
+                new_stock = capped_stock(b2b_data['stock'], policy)
                 change = {
                     'sku': sku,
                     'ean': woo_data.get('ean', ''),
                     'manage_stock': DEFAULT_MANAGE_STOCK,
                     'stock_status': b2b_data['stock_status'],
-                    'stock': b2b_data['stock']
+                    'stock': new_stock
                 }
                 changes.append(change)
                 
                 # Log entry for verification
                 log_entry = {
                     'key': sku or woo_data.get('ean'),
+                    'sku': sku,
+                    'ean': woo_data.get('ean', ''),
                     'old_stock': woo_data['current_stock'],
-                    'new_stock': b2b_data['stock'],
+                    'new_stock': new_stock,
                     'old_status': woo_data['current_status'],
                     'new_status': b2b_data['stock_status']
                 }
@@ -76,6 +98,10 @@ def detect_changes(b2b_products: Dict[str, Dict[str, Any]],
             # Find this SKU in woo_products
             for key, woo_data in woo_products.items():
                 if key != '_all_skus' and woo_data.get('sku') == sku:
+                    # Maintenance rows are no-ops and may be dropped by policy
+                    if policy and policy.get('drop_maintenance'):
+                        count_suppression(stats, ['drop_maintenance'], True)
+                        break
                     change = {
                         'sku': sku,
                         'ean': woo_data.get('ean', ''),
@@ -91,13 +117,17 @@ def detect_changes(b2b_products: Dict[str, Dict[str, Any]],
 
 
 def create_import_file(changes: List[Dict[str, Any]], 
-                      log_data: List[Dict[str, Any]]) -> Optional[str]:
+                      log_data: List[Dict[str, Any]],
+                      run_id: Optional[str] = None,
+                      store: Optional[str] = None) -> Optional[str]:
     """
-    Create import CSV file and log file for detected changes.
+    Create import CSV file and record detected changes in the change journal.
     
     Args:
         changes: List of changes for import
         log_data: List of change log entries
+        run_id: Identifier of the run, a new one is created if None
+        store: Optional store name, included in the import file name
         
     Returns:
         Path to the import file if changes were found, None otherwise
@@ -106,29 +136,33 @@ def create_import_file(changes: List[Dict[str, Any]],
         logger.info("No changes to import")
         return None
     
+    run_id = run_id or make_run_id()
+    
     # Save import CSV
-    import_file = save_csv_file(changes)
+    prefix = f"import_{store}" if store else "import"
+    import_file = save_csv_file(changes, f"{prefix}_{run_id}.csv")
     if import_file:
         logger.info(f"Import file created: {import_file.name}")
         logger.info(f"Contains {len(changes)} changes")
     
-    # Save log file
+    # Record changes in the journal
     if log_data:
-        log_file = save_log_file(log_data)
-        if log_file:
-            logger.info(f"Change log saved: {log_file.name}")
+        journal_file = append_changes(run_id, log_data, import_file, store)
+        logger.info(f"Changes recorded in journal: {journal_file.name} (run {run_id})")
     
     return import_file
 
 
 def sync_stock(b2b_products: Dict[str, Dict[str, Any]],
-              woo_products: Dict[str, Dict[str, Any]]) -> Optional[str]:
+              woo_products: Dict[str, Dict[str, Any]],
+              run_id: Optional[str] = None) -> Optional[str]:
     """
     Synchronize stock between B2B and WooCommerce.
     
     Args:
         b2b_products: Dictionary of B2B products with stock information
         woo_products: Dictionary of WooCommerce products with current stock information
+        run_id: Identifier of the run, a new one is created if None
         
     Returns:
         Path to the import file if changes were found, None otherwise
@@ -142,6 +176,6 @@ def sync_stock(b2b_products: Dict[str, Dict[str, Any]],
     logger.info(f"Found {len(changes)} products with changes or to be maintained")
     
     # Create import file
-    import_file = create_import_file(changes, log_data)
+    import_file = create_import_file(changes, log_data, run_id)
     
     return import_file
\ No newline at end of file
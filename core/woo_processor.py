@@ -2,19 +2,28 @@
 WooCommerce data processing module for WooCommerce Stock Sync application.
 """
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 from constants import DEFAULT_WOO_EXPORT
-from utils.file_utils import load_csv_file
+from utils.file_utils import load_csv_columns
 from utils.logger import logger
+from utils.shard import Shard, in_shard
 
+# Columns of the WooCommerce export used for the stock sync
+WOO_EXPORT_COLUMNS = ['sku', 'ean', 'post_parent', 'stock', 'stock_status']
 
-def load_woo_export(file_path: str = DEFAULT_WOO_EXPORT) -> Dict[str, Dict[str, Any]]:
+
+def load_woo_export(file_path: str = DEFAULT_WOO_EXPORT,
+                    shard: Optional[Shard] = None) -> Dict[str, Dict[str, Any]]:
     """
     Load and process WooCommerce export data.
     
+    Only the columns in WOO_EXPORT_COLUMNS are read, the remaining columns of
+    wide exports (descriptions, meta, images) are skipped.
+    
     Args:
         file_path: Path to the WooCommerce export CSV file
+        shard: Optional shard, only its products are loaded
         
     Returns:
         Dictionary of products with current stock information
@@ -31,39 +40,45 @@ def load_woo_export(file_path: str = DEFAULT_WOO_EXPORT) -> Dict[str, Dict[str,
         if not Path(file_path).exists():
             raise FileNotFoundError(f"File {file_path} not found")
             
-        # Load CSV data
-        rows = load_csv_file(file_path)
-        
-        for row in rows:
-            # Track all SKUs
-            if row.get('sku') and row['sku'].strip():
-                all_skus.add(row['sku'].strip())
-                
+        # Load only the needed CSV columns
+        for sku, ean, post_parent, stock, stock_status in load_csv_columns(file_path, WOO_EXPORT_COLUMNS):
+            sku = sku.strip()
+            
+            # Remove .0 from the end of EAN if present
+            ean = ean.strip()
+            if ean.endswith('.0'):
+                ean = ean[:-2]
+            
             # Parent product (has SKU and empty post_parent)
-            if row.get('sku') and row['sku'].strip() and (not row.get('post_parent') or row['post_parent'] == '' or row['post_parent'] == '0'):
-                key = f"sku_{row['sku'].strip()}"
+            is_parent = bool(sku) and (not post_parent or post_parent == '0')
+            # Variation (has EAN and non-empty post_parent)
+            is_variation = not is_parent and bool(ean) and bool(post_parent.strip())
+            key = f"ean_{ean}" if is_variation else f"sku_{sku}"
+            
+            # Skip rows handled by other shards
+            if shard is not None and not in_shard(key, shard):
+                continue
+            
+            # Track all SKUs
+            if sku:
+                all_skus.add(sku)
+            
+            if is_parent:
                 woo_products[key] = {
-                    'sku': row['sku'].strip(),
-                    'current_stock': int(float(row.get('stock', 0) or 0)),
-                    'current_status': row.get('stock_status', 'outofstock'),
+                    'sku': sku,
+                    'current_stock': int(float(stock or 0)),
+                    'current_status': stock_status or 'outofstock',
                     'type': 'parent'
                 }
             
-            # Variation (has EAN and non-empty post_parent)
-            elif row.get('ean') and row['ean'].strip() and row.get('post_parent') and row['post_parent'].strip():
-                # Remove .0 from the end of EAN if present
-                ean = row['ean'].strip()
-                if ean.endswith('.0'):
-                    ean = ean[:-2]
-                
-                key = f"ean_{ean}"
+            elif is_variation:
                 woo_products[key] = {
-                    'sku': row.get('sku', '').strip(),
+                    'sku': sku,
                     'ean': ean,
-                    'current_stock': int(float(row.get('stock', 0) or 0)),
-                    'current_status': row.get('stock_status', 'outofstock'),
+                    'current_stock': int(float(stock or 0)),
+                    'current_status': stock_status or 'outofstock',
                     'type': 'variation',
-                    'parent_id': row['post_parent']
+                    'parent_id': post_parent
                 }
         
         logger.info(f"Loaded {len(woo_products)} WooCommerce products")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+WooCommerce Stock Sync - Stock history query
+
+This script prints the stock history of a product (looked up by SKU or EAN)
+from the change journal.
+"""
+
+import argparse
+import sys
+
+from utils.journal import get_history
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="WooCommerce Stock Sync - stock history")
+    parser.add_argument(
+        "identifier",
+        help="SKU or EAN of the product"
+    )
+    parser.add_argument(
+        "-n", "--limit",
+        type=int,
+        default=None,
+        help="Show only the N most recent changes"
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Main function."""
+    args = parse_arguments()
+    history = get_history(args.identifier, args.limit)
+
+    if not history:
+        print(f"No changes recorded for {args.identifier}")
+        sys.exit(1)
+
+    for entry in history:
+        store = f"  store {entry['store']}" if entry['store'] else ""
+        print(f"{entry['ts']}  run {entry['run_id']}{store}  "
+              f"SKU {entry['sku'] or '-'}  EAN {entry['ean'] or '-'}: "
+              f"stock {entry['old_stock']} → {entry['new_stock']}, "
+              f"status {entry['old_status']} → {entry['new_status']}")
+
+
+if __name__ == "__main__":
+    main()
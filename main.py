@@ -14,9 +14,13 @@ from pathlib import Path
 
 from constants import DEFAULT_WOO_EXPORT
 from core.feed_processor import get_b2b_products
-from core.woo_processor import load_woo_export
-from core.sync_processor import sync_stock
+from core.store_processor import load_store_config, stores_from_files, sync_store, sync_stores
+from core.suppression import POLICY_NAMES, load_suppression_policy
+from utils.checkpoint import RunCheckpoint, RunLockedError, find_resumable_run, lock_path, run_lock
+from utils.file_utils import make_run_id
 from utils.logger import logger
+from utils.profiler import PROFILE_MODES, StageProfiler
+from utils.shard import parse_shard, shard_tag
 
 
 def parse_arguments():
@@ -24,15 +28,74 @@ def parse_arguments():
     parser = argparse.ArgumentParser(description="WooCommerce Stock Sync")
     parser.add_argument(
         "-f", "--file",
-        default=DEFAULT_WOO_EXPORT,
-        help=f"Path to WooCommerce export CSV file (default: {DEFAULT_WOO_EXPORT})"
+        action="append",
+        help=f"Path to WooCommerce export CSV file, repeat for several stores "
+             f"(default: {DEFAULT_WOO_EXPORT})"
+    )
+    parser.add_argument(
+        "--stores",
+        help="Path to JSON store config with the export file of each store"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of parallel store workers (default: one per store, up to CPU count)"
     )
     parser.add_argument(
         "--no-download",
         action="store_true",
         help="Skip downloading B2B feed (use the most recent downloaded file)"
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Download the full B2B feed even if a delta feed is configured"
+    )
+    parser.add_argument(
+        "--accept-feed",
+        action="store_true",
+        help="Accept a B2B feed with considerably fewer products than the last good feed"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume the last interrupted run from its last completed stage"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Detect changes and report suppression statistics without writing import files"
+    )
+    parser.add_argument(
+        "--shard",
+        help="Process only shard i of N (format i/N, e.g. 0/4), merge the shards "
+             "with merge_shards.py; requires --run-id"
+    )
+    parser.add_argument(
+        "--run-id",
+        help="Run identifier, shared by all shards of a sharded run "
+             "(an interrupted run with this ID is resumed)"
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="full",
+        choices=PROFILE_MODES,
+        help="Profile the pipeline stages: 'full' (cProfile + tracemalloc, default) "
+             "or 'sample' (low-overhead stack sampling)"
+    )
+    args = parser.parse_args()
+    if args.run_id and not args.run_id.replace('_', '').replace('-', '').isalnum():
+        parser.error("--run-id may only contain letters, digits, '_' and '-'")
+    if args.shard:
+        if not args.run_id:
+            parser.error("--shard requires --run-id")
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
 
 
 def main():
@@ -45,38 +108,100 @@ def main():
     
     # Parse command line arguments
     args = parse_arguments()
+    tag = shard_tag(args.shard) if args.shard else None
+    resumable_run = find_resumable_run(tag)
+    if args.run_id:
+        # A run started with an explicit ID always continues from its checkpoints
+        run_id = args.run_id
+        if RunCheckpoint(run_id, tag).run_dir.exists():
+            logger.info(f"Resuming run {run_id}")
+    elif args.resume and resumable_run:
+        run_id = resumable_run
+        logger.info(f"Resuming run {run_id}")
+    else:
+        if args.resume:
+            logger.info("No interrupted run to resume, starting a new run")
+        elif resumable_run:
+            logger.warning(f"Run {resumable_run} was interrupted, use --resume to continue it")
+        run_id = make_run_id()
+    logger.info(f"Run ID: {run_id}")
+    if tag:
+        logger.info(f"Shard: {args.shard[0]} of {args.shard[1]}")
+    profiler = StageProfiler(args.profile, f"{run_id}.{tag}" if tag else run_id)
     
     try:
-        # Check if WooCommerce export file exists
-        woo_export_path = args.file
-        if not Path(woo_export_path).exists():
-            logger.error(f"File {woo_export_path} not found!")
-            sys.exit(1)
-        
-        # Step 1 & 2: Download and parse B2B feed
-        b2b_products = get_b2b_products()
-        
-        # Step 3: Load WooCommerce export
-        woo_products = load_woo_export(woo_export_path)
+        with run_lock(run_id, lock_path(tag)):
+            checkpoint = RunCheckpoint(run_id, tag)
+            
+            # Resolve stores and check that their export files exist
+            stores = checkpoint.load("stores")
+            if stores is None:
+                if args.stores:
+                    stores = load_store_config(args.stores)
+                else:
+                    stores = stores_from_files(args.file or [DEFAULT_WOO_EXPORT])
+                for store in stores:
+                    if not Path(store['file']).exists():
+                        logger.error(f"File {store['file']} not found!")
+                        sys.exit(1)
+                checkpoint.save("stores", stores)
+            
+            # Steps 1 & 2: Download and validate B2B feed (or delta), fall back to the last good index
+            b2b_products = get_b2b_products(profiler=profiler, checkpoint=checkpoint,
+                                            shard=args.shard, full_refresh=args.full,
+                                            accept_feed=args.accept_feed, run_id=run_id)
+            
+            # Steps 3-5: Load exports, detect changes and create import files
+            policy = load_suppression_policy()
+            if len(stores) == 1:
+                results = [sync_store(b2b_products, stores[0], run_id, profiler,
+                                      policy, args.dry_run, checkpoint, args.shard)]
+            else:
+                # Not a profiled stage: forked workers must not inherit an active
+                # profiler, each worker profiles its own store stages instead
+                results = sync_stores(b2b_products, stores, run_id, args.workers,
+                                      args.profile, policy, args.dry_run, checkpoint,
+                                      args.shard)
+            
+            checkpoint.complete()
         
-        # Step 4 & 5: Detect changes and create import file
-        import_file = sync_stock(b2b_products, woo_products)
+        profiler.write_summary()
         
         # Print summary
         logger.info("=" * 50)
         logger.info("SUMMARY")
         logger.info("=" * 50)
-        if import_file:
-            logger.info(f"Import file: {import_file}")
-            logger.info("You can now import this file using WebToffee Import")
-        else:
-            logger.info("Stock levels are up to date, no import needed")
+        for result in results:
+            if result['name']:
+                logger.info(f"Store {result['name']} ({result['file']}): "
+                            f"{result['skus']} SKUs, {result['stock_changes']} stock changes, "
+                            f"{result['changes']} import rows")
+            if result['suppressed']:
+                suppressed = ", ".join(f"{name} {result['suppressed'][name]}"
+                                       for name in POLICY_NAMES if name in result['suppressed'])
+                logger.info(f"Suppressed rows: {result['suppressed'].get('total', 0)} "
+                            f"(each policy alone: {suppressed})")
+            if args.dry_run:
+                logger.info(f"Dry run: {result['changes']} import rows not written")
+            elif result.get('shard_result'):
+                logger.info(f"Shard result: {result['shard_result']}")
+            elif result['import_file']:
+                logger.info(f"Import file: {result['import_file']}")
+            else:
+                logger.info("Stock levels are up to date, no import needed")
+        if args.shard and not args.dry_run:
+            logger.info(f"Once all shards are done, merge them with: "
+                        f"python merge_shards.py --run-id {run_id}")
+        if any(result['import_file'] for result in results):
+            logger.info("You can now import the files using WebToffee Import")
         
         logger.info(f"End time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         logger.info("=" * 50)
         
     except Exception as e:
         logger.error(f"An error occurred: {e}")
+        if not isinstance(e, RunLockedError) and RunCheckpoint(run_id, tag).run_dir.exists():
+            logger.error(f"Run {run_id} can be continued with --resume")
         sys.exit(1)
 
 
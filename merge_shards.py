@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+WooCommerce Stock Sync - Shard merge
+
+This script merges the results of a sharded run (``main.py --shard i/N``)
+into one import file per store and records the changes in the journal.
+"""
+
+import argparse
+import sys
+
+from core.shard_processor import merge_shard_results
+from utils.checkpoint import RunLockedError, lock_path, run_lock
+from utils.logger import logger
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="WooCommerce Stock Sync - merge shards")
+    parser.add_argument(
+        "--run-id",
+        required=True,
+        help="Run identifier shared by all shards"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report the merged changes without writing import files"
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Main function."""
+    args = parse_arguments()
+
+    try:
+        with run_lock(args.run_id, lock_path("merge")):
+            results = merge_shard_results(args.run_id, args.dry_run)
+    except (ValueError, RunLockedError) as e:
+        logger.error(f"Cannot merge run {args.run_id}: {e}")
+        sys.exit(1)
+
+    for result in results:
+        store = f"Store {result['name']}: " if result['name'] else ""
+        logger.info(f"{store}{result['stock_changes']} stock changes, "
+                    f"{result['changes']} import rows")
+        if args.dry_run:
+            logger.info(f"Dry run: {result['changes']} import rows not written")
+        elif result['import_file']:
+            logger.info(f"Import file: {result['import_file']}")
+        else:
+            logger.info("Stock levels are up to date, no import needed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+"""
+Test configuration for WooCommerce Stock Sync application.
+
+The data directory is redirected to a temporary directory before the
+application modules (and their constants) are imported.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="stock_sync_test_")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,57 @@
+"""
+Tests for run checkpoints and the run lock.
+"""
+import multiprocessing
+
+import pytest
+
+from utils.checkpoint import RunLockedError, run_lock
+
+
+def hold_lock(lock_file, ready, release):
+    with run_lock("other", lock_file):
+        ready.set()
+        release.wait(10)
+
+
+def test_run_lock_excludes_other_process(tmp_path):
+    lock_file = tmp_path / "sync.lock"
+    ready = multiprocessing.Event()
+    release = multiprocessing.Event()
+    holder = multiprocessing.Process(target=hold_lock, args=(lock_file, ready, release))
+    holder.start()
+    try:
+        assert ready.wait(10)
+        with pytest.raises(RunLockedError, match="Run other"):
+            with run_lock("mine", lock_file):
+                pass
+    finally:
+        release.set()
+        holder.join(10)
+
+    with run_lock("mine", lock_file):
+        assert lock_file.read_text().endswith(" mine")
+
+
+def test_run_lock_held_while_holder_has_not_written(tmp_path):
+    # An empty lock file of a live holder must not be treated as stale
+    lock_file = tmp_path / "sync.lock"
+    with run_lock("first", lock_file):
+        lock_file.write_text("")
+        with pytest.raises(RunLockedError):
+            with run_lock("second", lock_file):
+                pass
+
+
+def test_run_lock_released_after_holder_dies(tmp_path):
+    lock_file = tmp_path / "sync.lock"
+    ready = multiprocessing.Event()
+    holder = multiprocessing.Process(target=hold_lock,
+                                     args=(lock_file, ready, multiprocessing.Event()))
+    holder.start()
+    assert ready.wait(10)
+    holder.kill()
+    holder.join(10)
+
+    with run_lock("mine", lock_file):
+        pass
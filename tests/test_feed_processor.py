@@ -0,0 +1,312 @@
+"""
+Tests for the B2B feed processing module.
+"""
+import copy
+from datetime import datetime, timedelta
+
+import pytest
+
+import core.feed_processor as feed_processor
+from constants import FEED_INDEX_FILE
+from core.feed_processor import (
+    FeedParser, FeedValidationError, apply_delta, download_feed, get_b2b_products,
+    load_last_good_index, parse_b2b_feed
+)
+from utils.profiler import StageProfiler
+
+
+def make_feed(products):
+    """Build a B2B feed from a dictionary of SKUs and their (EAN, quantity) items."""
+    body = "".join(
+        f"<product><mpn>{sku}</mpn><stock>"
+        + "".join(f'<item ean="{ean}" quantity="{qty}"/>' for ean, qty in items)
+        + "</stock></product>\n"
+        for sku, items in products.items()
+    )
+    return f'<?xml version="1.0"?>\n<products>\n{body}</products>\n'.encode()
+
+
+def test_parse_b2b_feed_totals():
+    products = parse_b2b_feed(make_feed({"A": [("1", 2), ("2", 3)]}))
+
+    assert products["sku_A"]["stock"] == 5
+    assert products["ean_1"]["stock"] == 2
+    assert products["ean_2"]["stock_status"] == "instock"
+
+
+def test_parse_b2b_feed_rejects_malformed_document():
+    content = make_feed({f"SKU{i}": [(str(i), 1)] for i in range(100)})
+    middle = content.index(b"<product><mpn>SKU50")
+    malformed = content[:middle] + b"<<garbage" + content[middle:]
+
+    with pytest.raises(FeedValidationError, match="not valid XML"):
+        parse_b2b_feed(malformed)
+
+
+def test_parse_b2b_feed_rejects_truncated_document():
+    content = make_feed({"A": [("1", 2)], "B": [("2", 3)]})
+
+    with pytest.raises(FeedValidationError, match="truncated"):
+        parse_b2b_feed(content[:-20])
+
+
+class FakeResponse:
+    """Streamed response serving the feed in chunks and counting the chunks read."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.read = 0
+        self.headers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+
+def test_download_feed_aborts_at_first_error(monkeypatch):
+    content = make_feed({f"SKU{i}": [(str(i), 1)] for i in range(100)})
+    middle = content.index(b"<product><mpn>SKU50")
+    chunks = [content[:middle], b"<<garbage"] + [content[middle:]] * 10
+    response = FakeResponse(chunks)
+    monkeypatch.setattr(feed_processor.requests, "get", lambda *args, **kwargs: response)
+
+    with pytest.raises(FeedValidationError, match="not valid XML"):
+        download_feed("http://feed.test/feed.xml", parser=FeedParser())
+    assert response.read == 2
+
+
+def test_download_feed_parses_while_streaming(monkeypatch):
+    content = make_feed({"A": [("1", 2)], "B": [("2", 0)]})
+    response = FakeResponse([content[:30], content[30:70], content[70:]])
+    monkeypatch.setattr(feed_processor.requests, "get", lambda *args, **kwargs: response)
+
+    parser = FeedParser()
+    assert download_feed("http://feed.test/feed.xml", parser=parser) == content
+    products = parser.close()
+    assert products["sku_B"]["stock_status"] == "outofstock"
+
+
+@pytest.fixture
+def serve_feed(monkeypatch):
+    """Serve the given full feed to download_feed and start without an index."""
+    monkeypatch.setattr(feed_processor, "B2B_DELTA_FEED_URL", None)
+    FEED_INDEX_FILE.unlink(missing_ok=True)
+
+    def serve(content):
+        monkeypatch.setattr(feed_processor.requests, "get",
+                            lambda *args, **kwargs: FakeResponse([content]))
+
+    yield serve
+    FEED_INDEX_FILE.unlink(missing_ok=True)
+
+
+def catalog(count):
+    return {f"SKU{i}": [(str(i), 1)] for i in range(count)}
+
+
+@pytest.mark.parametrize("mode", ["full", "sample"])
+def test_get_b2b_products_profiles_parsing_separately(serve_feed, tmp_path, mode):
+    serve_feed(make_feed(catalog(10)))
+    profiler = StageProfiler(mode, "run", tmp_path)
+
+    get_b2b_products("http://feed.test/feed.xml", profiler=profiler)
+
+    results = {result['stage']: result for result in profiler.results}
+    assert list(results) == ["download_feed", "parse_b2b_feed"]
+    assert 0 < results["parse_b2b_feed"]["seconds"] <= results["download_feed"]["seconds"]
+    assert "cpu_seconds" in results["parse_b2b_feed"]
+    assert ("allocated_mb" in results["parse_b2b_feed"]) == (mode == "full")
+
+
+def test_get_b2b_products_falls_back_on_shrunk_feed(serve_feed):
+    serve_feed(make_feed(catalog(10)))
+    get_b2b_products("http://feed.test/feed.xml")
+
+    serve_feed(make_feed(catalog(5)))
+    products = get_b2b_products("http://feed.test/feed.xml")
+
+    assert len(products) == 20
+    assert load_last_good_index()['product_count'] == 10
+
+
+def test_get_b2b_products_accepts_shrunk_feed_on_request(serve_feed):
+    serve_feed(make_feed(catalog(10)))
+    get_b2b_products("http://feed.test/feed.xml")
+
+    serve_feed(make_feed(catalog(5)))
+    products = get_b2b_products("http://feed.test/feed.xml", accept_feed=True)
+
+    assert len(products) == 10
+    assert load_last_good_index()['product_count'] == 5
+
+
+@pytest.mark.parametrize("content, hint", [
+    (make_feed(catalog(5)), True),
+    (make_feed(catalog(10))[:-20], False),
+])
+def test_get_b2b_products_refuses_stale_fallback(serve_feed, content, hint):
+    serve_feed(make_feed(catalog(10)))
+    get_b2b_products("http://feed.test/feed.xml")
+    index = load_last_good_index()
+    saved_at = datetime.now() - timedelta(hours=feed_processor.FEED_FALLBACK_MAX_AGE_HOURS + 1)
+    index['saved_at'] = saved_at.isoformat(timespec='seconds')
+    feed_processor.save_json_file(index, FEED_INDEX_FILE)
+
+    serve_feed(content)
+    with pytest.raises(FeedValidationError, match="older than") as error:
+        get_b2b_products("http://feed.test/feed.xml")
+    assert ("--accept-feed" in str(error.value)) == hint
+
+
+def test_shards_share_one_feed_download(serve_feed, monkeypatch):
+    content = make_feed(catalog(50))
+    downloads = []
+
+    def get(*args, **kwargs):
+        downloads.append(args)
+        return FakeResponse([content])
+
+    monkeypatch.setattr(feed_processor.requests, "get", get)
+
+    shards = [get_b2b_products("http://feed.test/feed.xml", shard=(i, 3), run_id="shared")
+              for i in range(3)]
+
+    assert len(downloads) == 1
+    merged = {key: product for products in shards for key, product in products.items()}
+    assert merged == parse_b2b_feed(content)
+    assert load_last_good_index()['product_count'] == 50
+
+
+def test_sharded_run_falls_back_on_shrunk_feed(serve_feed):
+    serve_feed(make_feed(catalog(10)))
+    first = [get_b2b_products("http://feed.test/feed.xml", shard=(i, 2), run_id="full")
+             for i in range(2)]
+
+    serve_feed(make_feed(catalog(5)))
+    second = [get_b2b_products("http://feed.test/feed.xml", shard=(i, 2), run_id="shrunk")
+              for i in range(2)]
+
+    assert second == first
+    assert load_last_good_index()['product_count'] == 10
+
+
+def test_shards_share_a_rejected_feed(serve_feed, monkeypatch):
+    serve_feed(b"<products><product><mpn>A</mpn>")
+    with pytest.raises(FeedValidationError, match="truncated"):
+        get_b2b_products("http://feed.test/feed.xml", shard=(0, 2), run_id="rejected")
+
+    def get(*args, **kwargs):
+        raise AssertionError("the second shard must not download the feed")
+
+    monkeypatch.setattr(feed_processor.requests, "get", get)
+    with pytest.raises(FeedValidationError, match="truncated"):
+        get_b2b_products("http://feed.test/feed.xml", shard=(1, 2), run_id="rejected")
+
+
+def build_index(products):
+    """Parse a full feed into a feed index."""
+    variants = {}
+    parsed = parse_b2b_feed(make_feed(products), variants=variants)
+    return {'products': parsed, 'variants': variants, 'product_count': len(variants)}
+
+
+def apply_feed_delta(index, products):
+    variants = {}
+    parsed = parse_b2b_feed(make_feed(products), variants=variants, delta=True)
+    return apply_delta(index, parsed, variants)
+
+
+def test_apply_delta_matches_full_feed():
+    full = {"A": [("1", 2), ("2", 3)], "B": [("3", 1)], "C": [("4", 0)]}
+    index = build_index(full)
+
+    changed = {"A": [("1", 0), ("2", 4)], "D": [("5", 7)]}
+    apply_feed_delta(index, changed)
+
+    expected = build_index(dict(full, **changed))
+    assert index['products'] == expected['products']
+    assert index['product_count'] == 4
+
+
+def test_apply_delta_keeps_unlisted_variants():
+    index = build_index({"A": [("1", 2), ("2", 3), ("3", 4)]})
+
+    apply_feed_delta(index, {"A": [("2", 10)]})
+
+    assert index['products']["ean_1"]["stock"] == 2
+    assert index['products']["ean_2"]["stock"] == 10
+    assert index['products']["ean_3"]["stock"] == 4
+    assert index['products']["sku_A"]["stock"] == 16
+
+
+def test_apply_delta_keeps_variant_with_invalid_quantity():
+    index = build_index({"A": [("1", 2), ("2", 3)]})
+
+    apply_feed_delta(index, {"A": [("1", "x"), ("2", 5)]})
+
+    assert index['products']["ean_1"]["stock"] == 2
+    assert index['products']["sku_A"]["stock"] == 7
+
+
+def test_apply_delta_moves_ean_between_parents():
+    index = build_index({"A": [("1", 2), ("2", 3)], "B": [("3", 1)]})
+
+    recomputed = apply_feed_delta(index, {"B": [("2", 3)]})
+
+    assert recomputed == 2
+    assert "2" not in index['variants']["A"]
+    assert index['products']["sku_A"]["stock"] == 2
+    assert index['products']["sku_B"]["stock"] == 4
+    assert index['products']["ean_2"]["stock"] == 3
+
+
+def test_apply_delta_sells_out_parent():
+    index = build_index({"A": [("1", 2)]})
+
+    apply_feed_delta(index, {"A": [("1", 0)]})
+
+    assert index['products']["sku_A"]["stock_status"] == "outofstock"
+
+
+def test_apply_empty_delta_keeps_index():
+    index = build_index({"A": [("1", 2)], "B": [("2", 0)]})
+    before = copy.deepcopy(index)
+
+    assert apply_feed_delta(index, {}) == 0
+    assert index == before
+
+
+def test_rejected_delta_keeps_index(serve_feed, monkeypatch):
+    serve_feed(make_feed(catalog(10)))
+    get_b2b_products("http://feed.test/feed.xml")
+    before = FEED_INDEX_FILE.read_bytes()
+
+    monkeypatch.setattr(feed_processor, "B2B_DELTA_FEED_URL", "http://feed.test/delta.xml")
+    serve_feed(b"<products><product><mpn>SKU1</mpn><stock><<garbage")
+    products = get_b2b_products("http://feed.test/feed.xml")
+
+    assert FEED_INDEX_FILE.read_bytes() == before
+    assert products == load_last_good_index()['products']
+
+
+def test_delta_applied_on_top_of_index(serve_feed, monkeypatch):
+    serve_feed(make_feed(catalog(10)))
+    get_b2b_products("http://feed.test/feed.xml")
+
+    monkeypatch.setattr(feed_processor, "B2B_DELTA_FEED_URL", "http://feed.test/delta.xml")
+    serve_feed(make_feed({"SKU3": [("3", 9)]}))
+    products = get_b2b_products("http://feed.test/feed.xml")
+
+    assert products["sku_SKU3"]["stock"] == 9
+    assert load_last_good_index()['products']["ean_3"]["stock"] == 9
+    assert len(products) == 20
@@ -0,0 +1,67 @@
+"""
+Tests for the file utility functions.
+"""
+import csv
+
+import pytest
+
+from utils.file_utils import load_csv_columns
+
+COLUMNS = ['sku', 'ean', 'post_parent', 'stock', 'stock_status']
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+
+
+def read_with_csv_module(path, columns):
+    """Reference result of csv.DictReader, missing values as empty strings."""
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return [tuple(row.get(column) or '' for column in columns)
+                for row in csv.DictReader(f)]
+
+
+@pytest.mark.parametrize("rows", [
+    # WebToffee layout: quoted multi-line description before the needed columns
+    [['ID', 'post_content', 'post_excerpt'] + COLUMNS + ['meta'],
+     ['1', '<p>Shoe, "mesh" upper</p>\n<ul>\n<li>250 g</li>\n</ul>', 'Shoe, light',
+      'A', '', '0', '5', 'instock', 'x, y'],
+     ['2', 'Line one\r\nline two', '', 'A-1', '123.0', '1', '2.0', 'instock', '"quoted"']],
+    # Quoted values in the needed columns
+    [COLUMNS + ['meta'],
+     ['A,1', '"12"', '0', '3', 'instock', 'tail'],
+     ['B', '', '', '', 'outofstock', '']],
+    # Needed columns last, unquoted filler first
+    [['meta', 'note'] + COLUMNS,
+     ['a', 'b', 'A', '', '0', '1', 'instock']],
+])
+def test_load_csv_columns_matches_csv_module(tmp_path, rows):
+    path = tmp_path / "export.csv"
+    write_csv(path, rows)
+
+    assert list(load_csv_columns(str(path), COLUMNS)) == read_with_csv_module(path, COLUMNS)
+
+
+def test_load_csv_columns_text_after_closing_quote(tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_text('note,sku,stock\n"a"b,A,1\n', encoding='utf-8')
+
+    assert list(load_csv_columns(str(path), ['sku', 'stock'])) == \
+        read_with_csv_module(path, ['sku', 'stock'])
+
+
+def test_load_csv_columns_missing_columns(tmp_path):
+    path = tmp_path / "export.csv"
+    write_csv(path, [['sku', 'stock'], ['A', '1']])
+
+    assert list(load_csv_columns(str(path), ['sku', 'ean', 'stock'])) == [('A', '', '1')]
+
+
+def test_load_csv_columns_short_rows(tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_text('post_content,sku,ean,stock\n"a, b",A\n"c"\nx,B,1,2\n\n',
+                    encoding='utf-8')
+
+    assert list(load_csv_columns(str(path), ['sku', 'ean', 'stock'])) == \
+        [('A', '', ''), ('', '', ''), ('B', '1', '2')]
@@ -0,0 +1,23 @@
+"""
+Tests for the change journal.
+"""
+from utils.journal import append_changes, get_history
+
+
+def change(sku, old_stock, new_stock):
+    return {'sku': sku, 'ean': '', 'old_stock': old_stock, 'new_stock': new_stock,
+            'old_status': 'instock', 'new_status': 'instock'}
+
+
+def test_append_changes_replaces_a_repeated_run():
+    append_changes("run_1", [change("J1", 1, 2)])
+    append_changes("run_1", [change("J1", 1, 2)], store="shop_cz")
+    append_changes("run_2", [change("J1", 2, 3)])
+
+    # Resumed run journals its changes again
+    append_changes("run_1", [change("J1", 1, 2)])
+    append_changes("run_1", [change("J1", 1, 2)], store="shop_cz")
+
+    history = get_history("J1")
+    assert sorted((entry['run_id'], entry['store'] or '') for entry in history) == \
+        [("run_1", ''), ("run_1", "shop_cz"), ("run_2", '')]
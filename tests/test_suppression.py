@@ -0,0 +1,131 @@
+"""
+Tests for the change suppression policies.
+"""
+import pytest
+
+from core.suppression import capped_stock, suppressing_policies, suppression_reason
+from core.sync_processor import detect_changes
+
+
+def stock_status(stock):
+    return 'instock' if stock > 0 else 'outofstock'
+
+
+def diff(old_stock, new_stock, policy, key='sku_A', stats=None):
+    """Run detect_changes for one SKU and return its import rows."""
+    woo = {key: {'sku': 'A', 'ean': '', 'current_stock': old_stock,
+                 'current_status': stock_status(old_stock)},
+           '_all_skus': ['A']}
+    b2b = {key: {'stock': new_stock, 'stock_status': stock_status(new_stock)}}
+    changes, _ = detect_changes(b2b, woo, policy, stats)
+    return changes
+
+
+@pytest.mark.parametrize("stock, policy, expected", [
+    (50, {'qty_cap': 20}, 20),
+    (20, {'qty_cap': 20}, 20),
+    (7, {'qty_cap': 20}, 7),
+    (50, {'qty_cap': 0}, 50),
+    (50, None, 50),
+])
+def test_capped_stock(stock, policy, expected):
+    assert capped_stock(stock, policy) == expected
+
+
+@pytest.mark.parametrize("old_stock, new_stock, expected", [
+    (20, 35, 'qty_cap'),   # both shown as the cap
+    (15, 35, None),        # moves up to the cap
+    (35, 40, None),        # stock above the cap is stepped down to the cap once
+    (35, 20, None),
+    (20, 12, None),
+])
+def test_qty_cap(old_stock, new_stock, expected):
+    assert suppression_reason('sku_A', old_stock, new_stock, {'qty_cap': 20}) == expected
+
+
+def test_qty_cap_step_down_emits_cap():
+    policy = {'qty_cap': 20}
+
+    changes = diff(35, 40, policy)
+
+    assert [change['stock'] for change in changes] == [20]
+    assert diff(20, 40, policy) == []
+
+
+@pytest.mark.parametrize("old_stock, new_stock, expected", [
+    (1, 4, 'qty_buckets'),   # both below 5
+    (4, 5, None),            # a bucket edge belongs to the upper bucket
+    (5, 9, 'qty_buckets'),
+    (9, 10, None),
+    (10, 49, 'qty_buckets'),
+    (49, 50, None),
+    (50, 500, 'qty_buckets'),
+])
+def test_qty_buckets_edges(old_stock, new_stock, expected):
+    policy = {'qty_buckets': [5, 10, 50]}
+
+    assert suppression_reason('sku_A', old_stock, new_stock, policy) == expected
+
+
+@pytest.mark.parametrize("old_stock, new_stock, expected", [
+    (10, 12, 'min_delta'),
+    (10, 8, 'min_delta'),
+    (10, 13, None),
+    (10, 7, None),
+])
+def test_min_delta(old_stock, new_stock, expected):
+    assert suppression_reason('sku_A', old_stock, new_stock, {'min_delta': 3}) == expected
+
+
+def test_cooldown_uses_product_key():
+    policy = {'recent_keys': {'sku_A', 'ean_123'}}
+
+    assert suppression_reason('sku_A', 3, 8, policy) == 'cooldown'
+    assert suppression_reason('ean_123', 3, 8, policy) == 'cooldown'
+    assert suppression_reason('sku_B', 3, 8, policy) is None
+    assert suppression_reason('ean_A', 3, 8, policy) is None
+
+
+@pytest.mark.parametrize("policy", [
+    {'qty_cap': 20},
+    {'qty_buckets': [5, 10, 50]},
+    {'min_delta': 100},
+    {'recent_keys': {'sku_A'}},
+])
+@pytest.mark.parametrize("old_stock, new_stock", [(0, 3), (3, 0)])
+def test_status_changes_are_never_suppressed(policy, old_stock, new_stock):
+    stats = {}
+
+    changes = diff(old_stock, new_stock, policy, stats=stats)
+
+    assert [change['stock_status'] for change in changes] == [stock_status(new_stock)]
+    assert not stats.get('total')
+
+
+def test_suppressing_policies_counts_each_policy_alone():
+    policy = {'qty_cap': 20, 'qty_buckets': [5, 10, 50], 'min_delta': 3,
+              'recent_keys': {'sku_A'}}
+
+    assert suppressing_policies('sku_A', 11, 12, policy) == \
+        ['qty_buckets', 'min_delta', 'cooldown']
+    assert suppressing_policies('sku_B', 20, 60, policy) == ['qty_cap']
+    # Stepped down to the cap: emitted, but buckets alone would drop it
+    assert suppressing_policies('sku_B', 30, 40, policy) == ['qty_buckets']
+    assert suppressing_policies('sku_A', 1, 2, None) == []
+
+
+def test_detect_changes_stats():
+    policy = {'qty_cap': 20, 'qty_buckets': [5, 10, 50], 'min_delta': 3}
+    woo = {'_all_skus': []}
+    b2b = {}
+    for key, old_stock, new_stock in [('sku_A', 11, 12), ('sku_B', 20, 60),
+                                      ('sku_C', 30, 40), ('sku_D', 1, 9)]:
+        woo[key] = {'sku': '', 'ean': '', 'current_stock': old_stock,
+                    'current_status': 'instock'}
+        b2b[key] = {'stock': new_stock, 'stock_status': 'instock'}
+    stats = {}
+
+    changes, _ = detect_changes(b2b, woo, policy, stats)
+
+    assert [change['stock'] for change in changes] == [20, 9]
+    assert stats == {'total': 2, 'qty_cap': 1, 'qty_buckets': 2, 'min_delta': 1}
@@ -0,0 +1,188 @@
+"""
+Run checkpoints for WooCommerce Stock Sync application.
+
+Every finished stage of a run (validated feed index, loaded store exports,
+computed change sets) is saved under ``DATA_DIR/runs/<run_id>/``,
+so an interrupted run can be resumed with ``--resume`` instead of starting
+over. The checkpoints of a run are removed once it completes. A lock on
+``DATA_DIR/sync.lock`` prevents two runs from overlapping.
+
+Sharded runs pass a tag (e.g. ``shard0of4``) that keeps their checkpoints
+(``<run_id>.<tag>``) and lock file (``sync.<tag>.lock``) apart, so shards can
+share one data directory.
+"""
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from constants import DATA_DIR, RUNS_DIR, LOCK_FILE
+from utils.file_utils import save_json_file, load_json_file
+from utils.logger import logger
+
+
+class RunLockedError(Exception):
+    """Raised when another sync run holds the lock."""
+
+
+def _try_lock(fd: int) -> bool:
+    """Try to take an exclusive lock on an open file without blocking."""
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(fd: int):
+    """Release a lock taken by _try_lock."""
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def lock_path(tag: Optional[str] = None) -> Path:
+    """
+    Return the lock file for runs with the given tag.
+
+    Args:
+        tag: Optional run tag, e.g. a shard name
+
+    Returns:
+        Path to the lock file
+    """
+    return DATA_DIR / f"sync.{tag}.lock" if tag else LOCK_FILE
+
+
+def _run_dir_name(run_id: str, tag: Optional[str]) -> str:
+    """Return the checkpoint directory name of a run."""
+    return f"{run_id}.{tag}" if tag else run_id
+
+
+@contextmanager
+def run_lock(run_id: str, lock_file: Path = LOCK_FILE,
+             wait: bool = False) -> Iterator[None]:
+    """
+    Hold the sync lock for the duration of the context.
+    
+    The lock is an OS file lock on a persistent lock file, so it is released
+    by the OS when the holding process dies and can never be taken over from
+    a live run. The file contains the PID and run ID of the holder for the
+    error message only.
+    
+    Args:
+        run_id: Identifier of the run taking the lock
+        lock_file: Path to the lock file
+        wait: Wait until the lock is released instead of failing
+    
+    Raises:
+        RunLockedError: If another run holds the lock and ``wait`` is False
+    """
+    fd = os.open(str(lock_file), os.O_CREAT | os.O_RDWR)
+    waiting = False
+    while not _try_lock(fd):
+        try:
+            pid, other_run = os.read(fd, 256).decode().strip().split(maxsplit=1)
+            holder = f"Run {other_run} (PID {pid})"
+        except (OSError, ValueError):
+            holder = "Another run"
+        if not wait:
+            os.close(fd)
+            raise RunLockedError(f"{holder} is already in progress")
+        if not waiting:
+            logger.info(f"Waiting for the lock {lock_file.name}: {holder} holds it")
+            waiting = True
+        os.lseek(fd, 0, os.SEEK_SET)
+        time.sleep(1)
+    
+    try:
+        os.ftruncate(fd, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, f"{os.getpid()} {run_id}".encode())
+        yield
+    finally:
+        os.ftruncate(fd, 0)
+        _unlock(fd)
+        os.close(fd)
+
+
+def _list_runs(tag: Optional[str] = None) -> List[str]:
+    """Return identifiers of unfinished runs with the given tag, oldest first."""
+    if not RUNS_DIR.exists():
+        return []
+    runs = []
+    for path in RUNS_DIR.iterdir():
+        if not path.is_dir():
+            continue
+        run_id, _, run_tag = path.name.partition('.')
+        if (run_tag or None) == tag:
+            runs.append(run_id)
+    return sorted(runs)
+
+
+def find_resumable_run(tag: Optional[str] = None) -> Optional[str]:
+    """
+    Find the most recent run that did not complete.
+
+    Args:
+        tag: Optional run tag, e.g. a shard name
+
+    Returns:
+        Run identifier, None if there is nothing to resume
+    """
+    runs = _list_runs(tag)
+    return runs[-1] if runs else None
+
+
+class RunCheckpoint:
+    """
+    Checkpoints of one sync run.
+
+    Stages are stored as JSON and written atomically, so an existing
+    checkpoint is always complete.
+    """
+
+    def __init__(self, run_id: str, tag: Optional[str] = None):
+        self.run_id = run_id
+        self.tag = tag
+        self.run_dir = RUNS_DIR / _run_dir_name(run_id, tag)
+
+    def _path(self, stage: str) -> Path:
+        return self.run_dir / f"{stage}.json"
+
+    def save(self, stage: str, data: Any):
+        """Save a JSON-serializable stage result."""
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        save_json_file(data, self._path(stage))
+        logger.info(f"Checkpoint saved: {stage}")
+
+    def load(self, stage: str) -> Optional[Any]:
+        """Load a JSON stage result, None if the stage did not finish."""
+        data = load_json_file(self._path(stage))
+        if data is not None:
+            logger.info(f"Resuming from checkpoint: {stage}")
+        return data
+
+    def complete(self):
+        """
+        Remove the checkpoints of this run and of older unfinished runs.
+
+        Older unfinished runs are superseded by a run that completed.
+        """
+        for run_id in _list_runs(self.tag):
+            if run_id <= self.run_id:
+                shutil.rmtree(RUNS_DIR / _run_dir_name(run_id, self.tag), ignore_errors=True)
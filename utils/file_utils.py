@@ -2,14 +2,30 @@
 File utility functions for WooCommerce Stock Sync application.
 """
 import csv
+import json
+import os
+from operator import itemgetter
 from datetime import datetime
 from pathlib import Path
 import sys
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 
 from constants import DATA_DIR, IMPORT_FIELDNAMES
 
 
+def make_run_id() -> str:
+    """
+    Create an identifier for a sync run.
+    
+    Microseconds keep the identifiers of runs started within the same second
+    apart while preserving their chronological order.
+    
+    Returns:
+        Run identifier in the YYYYMMDD_HHMMSS_ffffff format
+    """
+    return datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+
 def load_csv_file(file_path: str) -> List[Dict[str, Any]]:
     """
     Load data from a CSV file.
@@ -32,6 +48,127 @@ def load_csv_file(file_path: str) -> List[Dict[str, Any]]:
         sys.exit(1)
 
 
+def _iter_csv_records(f) -> Iterator[str]:
+    """
+    Split an open CSV file into raw records.
+    
+    A record ends at a line break outside quotes, i.e. once the number of
+    quote characters seen in the record is even (escaped quotes are doubled).
+    """
+    parts = []
+    quotes = 0
+    for line in f:
+        quotes += line.count('"')
+        parts.append(line)
+        if quotes % 2:
+            continue
+        yield parts[0] if len(parts) == 1 else ''.join(parts)
+        parts = []
+        quotes = 0
+    if parts:
+        yield ''.join(parts)
+
+
+def _split_quoted_prefix(record: str, count: int) -> Optional[List[str]]:
+    """
+    Split the first ``count`` fields of a CSV record that contains quotes.
+    
+    Quoted fields (which may contain commas, doubled quotes and line breaks)
+    are unquoted like the csv module does; the rest of the record is not
+    scanned. Returns None for records the csv module should handle, e.g. text
+    after a closing quote.
+    """
+    fields = []
+    pos = 0
+    length = len(record)
+    while len(fields) < count:
+        if pos < length and record[pos] == '"':
+            parts = []
+            start = pos + 1
+            while True:
+                quote = record.find('"', start)
+                if quote == -1:
+                    return None
+                if record.startswith('"', quote + 1):
+                    # Doubled quote inside a quoted field
+                    parts.append(record[start:quote + 1])
+                    start = quote + 2
+                    continue
+                parts.append(record[start:quote])
+                break
+            fields.append(''.join(parts))
+            pos = quote + 1
+            if pos == length:
+                break
+            if record[pos] != ',':
+                return None
+            pos += 1
+        else:
+            comma = record.find(',', pos)
+            if comma == -1:
+                fields.append(record[pos:])
+                break
+            fields.append(record[pos:comma])
+            pos = comma + 1
+    return fields
+
+
+def load_csv_columns(file_path: str, columns: List[str]) -> Iterator[Tuple[str, ...]]:
+    """
+    Read selected columns from a CSV file.
+    
+    Column indexes are looked up once in the header. Each record is split
+    only up to the last needed column, so the unused columns of wide files
+    (descriptions, meta, images) are never tokenized. Quoted values before
+    the last needed column (e.g. multi-line descriptions in WebToffee
+    exports) are unquoted by a quote-aware split of the same prefix. Columns
+    missing from the header are returned as empty strings.
+    
+    Args:
+        file_path: Path to the CSV file
+        columns: Names of the columns to read
+        
+    Returns:
+        Iterator over tuples with the values of ``columns`` in their order
+        
+    Raises:
+        Exception: If file cannot be read
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            records = _iter_csv_records(f)
+            header = next(csv.reader([next(records, '')]), [])
+            
+            # Missing columns point to an empty value past the needed fields
+            width = len(header)
+            indexes = [header.index(column) if column in header else width
+                       for column in columns]
+            needed = max(indexes) + 1
+            padding = [''] * (needed + 1)
+            if len(indexes) > 1:
+                getter = itemgetter(*indexes)
+            else:
+                getter = lambda row: (row[indexes[0]],)
+            
+            for record in records:
+                record = record.rstrip('\r\n')
+                if not record:
+                    continue
+                
+                fields = record.split(',', needed)
+                if '"' in record and any('"' in field for field in fields[:needed]):
+                    fields = _split_quoted_prefix(record, needed)
+                    if fields is None:
+                        fields = next(csv.reader([record]))
+                
+                if len(fields) <= needed:
+                    fields.extend(padding[len(fields):])
+                yield getter(fields)
+    except Exception as e:
+        print(f"Error reading CSV file {file_path}: {e}")
+        sys.exit(1)
+
+
 def save_csv_file(data: List[Dict[str, Any]], filename: Optional[str] = None) -> Path:
     """
     Save data to a CSV file.
@@ -50,8 +187,7 @@ def save_csv_file(data: List[Dict[str, Any]], filename: Optional[str] = None) ->
         return None
         
     if not filename:
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"import_{timestamp}.csv"
+        filename = f"import_{make_run_id()}.csv"
         
     file_path = DATA_DIR / filename
     
@@ -66,37 +202,38 @@ def save_csv_file(data: List[Dict[str, Any]], filename: Optional[str] = None) ->
         sys.exit(1)
 
 
-def save_log_file(log_data: List[Dict[str, Any]], prefix: str = "change_log") -> Path:
+def save_json_file(data: Any, file_path: Path) -> Path:
     """
-    Save log data to a text file.
+    Save data to a JSON file atomically.
+    
+    The data is written to a temporary file first, so an interrupted write
+    never leaves a partial file behind.
     
     Args:
-        log_data: List of log entries
-        prefix: Prefix for the log filename
+        data: JSON-serializable data
+        file_path: Path to the JSON file
         
     Returns:
-        Path to the saved log file
+        Path to the saved file
+    """
+    tmp_path = file_path.with_name(file_path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def load_json_file(file_path: Path) -> Optional[Any]:
+    """
+    Load data from a JSON file.
+    
+    Args:
+        file_path: Path to the JSON file
         
-    Raises:
-        Exception: If file cannot be written
+    Returns:
+        Loaded data, None if the file does not exist
     """
-    if not log_data:
+    if not file_path.exists():
         return None
-        
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    log_file = DATA_DIR / f"{prefix}_{timestamp}.txt"
-    
-    try:
-        with open(log_file, 'w', encoding='utf-8') as f:
-            f.write("=== LOG ZMĚN ===\n")
-            f.write(f"Čas: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            
-            for entry in log_data:
-                f.write(f"SKU/EAN: {entry['key']}: "
-                       f"Sklad {entry['old_stock']} → {entry['new_stock']}, "
-                       f"Status {entry['old_status']} → {entry['new_status']}\n")
-                       
-        return log_file
-    except Exception as e:
-        print(f"Error writing log file {log_file}: {e}")
-        sys.exit(1)
\ No newline at end of file
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""
+Change journal for WooCommerce Stock Sync application.
+
+Every emitted stock change is appended to a SQLite journal together with the
+run that produced it. Journal segments roll over monthly
+(``journal_YYYYMM.sqlite``) and segments older than ``JOURNAL_KEEP_MONTHS``
+are compacted to the last change of each product.
+"""
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set
+
+from constants import JOURNAL_DIR, JOURNAL_KEEP_MONTHS
+from utils.logger import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT NOT NULL,
+    store TEXT NOT NULL DEFAULT '',
+    ts TEXT NOT NULL,
+    import_file TEXT,
+    change_count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, store)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    sku TEXT,
+    ean TEXT,
+    old_stock INTEGER,
+    new_stock INTEGER,
+    old_status TEXT,
+    new_status TEXT,
+    store TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_changes_sku ON changes (sku, ts);
+CREATE INDEX IF NOT EXISTS idx_changes_ean ON changes (ean, ts);
+"""
+
+HISTORY_COLUMNS = ("id, run_id, ts, sku, ean, old_stock, new_stock, "
+                   "old_status, new_status, store")
+
+# PRAGMA user_version marker for segments that were already compacted
+COMPACTED_VERSION = 1
+
+
+def _segment_path(when: datetime) -> Path:
+    """Return the journal segment path for the month of ``when``."""
+    return JOURNAL_DIR / f"journal_{when.strftime('%Y%m')}.sqlite"
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    """Open a journal segment and make sure the schema exists."""
+    conn = sqlite3.connect(str(path), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    return conn
+
+
+def _store_column_missing(conn: sqlite3.Connection) -> bool:
+    """Check whether a segment predates the store column."""
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(changes)")}
+    return 'store' not in columns
+
+
+def _migrate(conn: sqlite3.Connection):
+    """Upgrade segments written before the journal recorded store names."""
+    if not _store_column_missing(conn):
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Another process may have migrated the segment in the meantime
+        if _store_column_missing(conn):
+            conn.execute("ALTER TABLE changes ADD COLUMN store TEXT")
+            conn.execute("ALTER TABLE runs RENAME TO runs_old")
+            conn.execute(
+                "CREATE TABLE runs (run_id TEXT NOT NULL, store TEXT NOT NULL DEFAULT '', "
+                "ts TEXT NOT NULL, import_file TEXT, change_count INTEGER NOT NULL, "
+                "PRIMARY KEY (run_id, store))"
+            )
+            conn.execute(
+                "INSERT INTO runs (run_id, ts, import_file, change_count) "
+                "SELECT run_id, ts, import_file, change_count FROM runs_old"
+            )
+            conn.execute("DROP TABLE runs_old")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _list_segments() -> List[Path]:
+    """Return journal segments sorted from newest to oldest."""
+    if not JOURNAL_DIR.exists():
+        return []
+    return sorted(JOURNAL_DIR.glob("journal_*.sqlite"), reverse=True)
+
+
+def append_changes(run_id: str, log_data: List[Dict[str, Any]],
+                   import_file: Optional[Path] = None,
+                   store: Optional[str] = None) -> Path:
+    """
+    Append change log entries of one run to the journal.
+
+    Writing the same run and store again replaces its earlier entries, so a
+    resumed or repeated run does not duplicate its changes.
+
+    Args:
+        run_id: Identifier of the run that produced the changes
+        log_data: List of change log entries
+        import_file: Optional path to the import file of the run
+        store: Optional name of the store the changes belong to
+
+    Returns:
+        Path to the journal segment the entries were written to
+    """
+    JOURNAL_DIR.mkdir(exist_ok=True)
+    now = datetime.now()
+    ts = now.isoformat(timespec='seconds')
+    segment = _segment_path(now)
+
+    # A run repeated after the month rolled over was journaled in an older segment
+    for other in _list_segments():
+        if other != segment:
+            _delete_run(other, run_id, store)
+
+    conn = _connect(segment)
+    try:
+        with conn:
+            conn.execute("DELETE FROM changes WHERE run_id = ? AND store IS ?", (run_id, store))
+            conn.execute(
+                "INSERT OR REPLACE INTO runs (run_id, store, ts, import_file, change_count) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (run_id, store or '', ts, str(import_file) if import_file else None,
+                 len(log_data))
+            )
+            conn.executemany(
+                "INSERT INTO changes (run_id, ts, sku, ean, old_stock, new_stock, "
+                "old_status, new_status, store) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, ts, entry.get('sku') or None, entry.get('ean') or None,
+                  entry['old_stock'], entry['new_stock'],
+                  entry['old_status'], entry['new_status'], store)
+                 for entry in log_data]
+            )
+    finally:
+        conn.close()
+
+    compact_journal()
+    return segment
+
+
+def _delete_run(segment: Path, run_id: str, store: Optional[str]):
+    """Remove the entries of one run and store from a journal segment."""
+    conn = _connect(segment)
+    try:
+        with conn:
+            if conn.execute("SELECT 1 FROM runs WHERE run_id = ? AND store = ?",
+                            (run_id, store or '')).fetchone():
+                conn.execute("DELETE FROM changes WHERE run_id = ? AND store IS ?",
+                             (run_id, store))
+                conn.execute("DELETE FROM runs WHERE run_id = ? AND store = ?",
+                             (run_id, store or ''))
+    finally:
+        conn.close()
+
+
+def get_history(identifier: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Return the stock history of a product, newest change first.
+
+    Args:
+        identifier: SKU or EAN of the product
+        limit: Maximum number of entries to return, all if None
+
+    Returns:
+        List of journal entries
+    """
+    history = []
+
+    for segment in _list_segments():
+        conn = _connect(segment)
+        try:
+            rows = conn.execute(
+                f"SELECT {HISTORY_COLUMNS} FROM changes WHERE sku = ? "
+                f"UNION SELECT {HISTORY_COLUMNS} FROM changes WHERE ean = ? "
+                "ORDER BY ts DESC, id DESC",
+                (identifier, identifier)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        history.extend(dict(row) for row in rows)
+        if limit is not None and len(history) >= limit:
+            return history[:limit]
+
+    return history
+
+
+def get_recent_change_keys(since: datetime, store: Optional[str] = None) -> Set[str]:
+    """
+    Return the keys of products whose stock changed since a given time.
+
+    Keys use the same ``sku_<SKU>`` / ``ean_<EAN>`` format as the product
+    dictionaries; variations are identified by EAN.
+
+    Args:
+        since: Start of the time window
+        store: Optional store name to limit the lookup to
+
+    Returns:
+        Set of product keys
+    """
+    keys = set()
+    since_ts = since.isoformat(timespec='seconds')
+    since_segment = _segment_path(since).name
+
+    for segment in _list_segments():
+        if segment.name < since_segment:
+            break
+
+        conn = _connect(segment)
+        try:
+            rows = conn.execute(
+                "SELECT DISTINCT sku, ean FROM changes WHERE ts >= ? AND store IS ?",
+                (since_ts, store)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        for row in rows:
+            keys.add(f"ean_{row['ean']}" if row['ean'] else f"sku_{row['sku']}")
+
+    return keys
+
+
+def compact_journal(keep_months: int = JOURNAL_KEEP_MONTHS) -> List[Path]:
+    """
+    Compact journal segments older than ``keep_months``.
+
+    A compacted segment keeps only the last change of every SKU/EAN per store,
+    so the question "when did this product last change" can still be answered.
+
+    Args:
+        keep_months: Number of most recent monthly segments kept in full
+
+    Returns:
+        List of segments compacted by this call
+    """
+    compacted = []
+
+    for segment in _list_segments()[keep_months:]:
+        conn = _connect(segment)
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= COMPACTED_VERSION:
+                continue
+
+            with conn:
+                conn.execute(
+                    "DELETE FROM changes WHERE id NOT IN ("
+                    "SELECT MAX(id) FROM changes GROUP BY sku, ean, store)"
+                )
+                conn.execute(f"PRAGMA user_version = {COMPACTED_VERSION}")
+            conn.execute("VACUUM")
+            compacted.append(segment)
+            logger.info(f"Journal segment compacted: {segment.name}")
+        finally:
+            conn.close()
+
+    return compacted
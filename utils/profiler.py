@@ -0,0 +1,248 @@
+"""
+Profiling utility for WooCommerce Stock Sync application.
+
+Two modes are supported:
+
+- ``full``: every stage runs under cProfile and tracemalloc. A ``.prof`` dump,
+  a text report of the hottest functions and a report of the top allocations
+  are written per stage.
+- ``sample``: a background thread samples the stack of the main thread at a
+  fixed interval and writes collapsed stacks (flamegraph format) per stage.
+  The overhead is low enough to keep it enabled in scheduled runs.
+
+Work that runs in many short parts interleaved with a stage, such as parsing
+the feed while it downloads, is accounted to a sub-stage: its wall and CPU
+time (and in ``full`` mode its traced allocations) are summed over all parts.
+
+Reports are written to ``DATA_DIR/profiles/<run_id>/``.
+"""
+import cProfile
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
+
+from constants import PROFILES_DIR, PROFILE_SAMPLE_INTERVAL
+from utils.logger import logger
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+PROFILE_MODES = ('full', 'sample')
+
+# Number of entries in the text reports
+REPORT_LIMIT = 30
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Return peak resident memory of the process in MB, if available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class _StackSampler(threading.Thread):
+    """Background thread counting the stacks of one thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class StageTimer:
+    """
+    Accumulate the cost of code run in many parts, entered around each part.
+
+    Allocations are only measured while tracemalloc is tracing, i.e. inside
+    a stage profiled in ``full`` mode.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.allocated: Optional[int] = None
+
+    def __enter__(self) -> 'StageTimer':
+        if self.enabled:
+            self._traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+            self._cpu_start = time.process_time()
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        if self.enabled:
+            self.seconds += time.perf_counter() - self._start
+            self.cpu_seconds += time.process_time() - self._cpu_start
+            if self._traced is not None and tracemalloc.is_tracing():
+                allocated = tracemalloc.get_traced_memory()[0] - self._traced
+                self.allocated = (self.allocated or 0) + allocated
+        return False
+
+
+class StageProfiler:
+    """
+    Profile named stages of the sync pipeline.
+
+    With ``mode=None`` the profiler is disabled and stages run unchanged.
+    """
+
+    def __init__(self, mode: Optional[str], run_id: str,
+                 output_dir: Optional[Path] = None):
+        if mode is not None and mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.mode = mode
+        self.output_dir = (output_dir or PROFILES_DIR) / run_id
+        self.results: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Profile the code run inside the context as stage ``name``.
+
+        Args:
+            name: Stage name used for the report file names
+        """
+        if self.mode is None:
+            yield
+            return
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if self.mode == 'full':
+            with self._profile_full(name):
+                yield
+        else:
+            with self._profile_sample(name):
+                yield
+
+    @contextmanager
+    def substage(self, name: str) -> Iterator[StageTimer]:
+        """
+        Account the parts of stage ``name`` that run inside another stage.
+
+        The yielded timer is entered around each part; the accumulated time
+        is recorded when the context exits. The parts still count towards
+        the enclosing stage as well.
+
+        Args:
+            name: Stage name used in the summary
+        """
+        timer = StageTimer(self.mode is not None)
+        try:
+            yield timer
+        finally:
+            if self.mode is not None:
+                extra = {'cpu_seconds': timer.cpu_seconds}
+                if timer.allocated is not None:
+                    extra['allocated_mb'] = timer.allocated / (1024 * 1024)
+                self._record(name, timer.seconds, **extra)
+
+    @contextmanager
+    def _profile_full(self, name: str) -> Iterator[None]:
+        """Run a stage under cProfile and tracemalloc."""
+        tracemalloc.start(25)
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            profile.dump_stats(str(self.output_dir / f"{name}.prof"))
+            with open(self.output_dir / f"{name}_stats.txt", 'w', encoding='utf-8') as f:
+                stats = pstats.Stats(profile, stream=f)
+                stats.sort_stats('cumulative').print_stats(REPORT_LIMIT)
+
+            with open(self.output_dir / f"{name}_alloc.txt", 'w', encoding='utf-8') as f:
+                f.write(f"Peak traced memory: {peak / (1024 * 1024):.1f} MB\n\n")
+                for stat in snapshot.statistics('lineno')[:REPORT_LIMIT]:
+                    f.write(f"{stat}\n")
+
+            self._record(name, elapsed, traced_peak_mb=peak / (1024 * 1024))
+
+    @contextmanager
+    def _profile_sample(self, name: str) -> Iterator[None]:
+        """Run a stage under the low-overhead stack sampler."""
+        sampler = _StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            elapsed = time.perf_counter() - start
+
+            with open(self.output_dir / f"{name}.folded", 'w', encoding='utf-8') as f:
+                for stack, count in sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+            self._record(name, elapsed, samples=sum(sampler.stacks.values()))
+
+    def _record(self, name: str, elapsed: float, **extra: Any):
+        """Store and log the result of a profiled stage."""
+        result = {'stage': name, 'seconds': elapsed, 'peak_rss_mb': _peak_rss_mb()}
+        result.update(extra)
+        self.results.append(result)
+        logger.info(f"Profile [{name}]: {elapsed:.2f}s")
+
+    def write_summary(self) -> Optional[Path]:
+        """
+        Write a summary of all profiled stages.
+
+        Returns:
+            Path to the summary file, None if nothing was profiled
+        """
+        if not self.results:
+            return None
+
+        summary_file = self.output_dir / "summary.txt"
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            f.write(f"Profile mode: {self.mode}\n\n")
+            for result in self.results:
+                f.write(f"{result['stage']}: {result['seconds']:.3f}s")
+                if 'cpu_seconds' in result:
+                    f.write(f" (CPU {result['cpu_seconds']:.3f}s)")
+                if 'allocated_mb' in result:
+                    f.write(f", allocated {result['allocated_mb']:.1f} MB")
+                if result['peak_rss_mb'] is not None:
+                    f.write(f", peak RSS {result['peak_rss_mb']:.1f} MB")
+                if 'traced_peak_mb' in result:
+                    f.write(f", peak traced {result['traced_peak_mb']:.1f} MB")
+                if 'samples' in result:
+                    f.write(f", {result['samples']} samples")
+                f.write("\n")
+
+        logger.info(f"Profiles saved: {self.output_dir}")
+        return summary_file
@@ -0,0 +1,60 @@
+"""
+Sharding utility for WooCommerce Stock Sync application.
+
+Products are assigned to shards by a stable hash of their key
+(``sku_<SKU>`` / ``ean_<EAN>``), so every worker or node handles the same
+products of both the B2B feed and the WooCommerce export.
+"""
+import zlib
+from typing import Tuple
+
+Shard = Tuple[int, int]
+
+
+def parse_shard(spec: str) -> Shard:
+    """
+    Parse a shard specification.
+
+    Args:
+        spec: Shard in the ``i/N`` format, where ``0 <= i < N``
+
+    Returns:
+        Tuple with the shard index and the number of shards
+
+    Raises:
+        ValueError: If the specification is invalid
+    """
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected i/N (e.g. 0/4)")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{spec}', index must be between 0 and {count - 1}")
+    return index, count
+
+
+def shard_tag(shard: Shard) -> str:
+    """
+    Return the name of a shard used in file names.
+
+    Args:
+        shard: Tuple with the shard index and the number of shards
+
+    Returns:
+        Shard name, e.g. ``shard0of4``
+    """
+    return f"shard{shard[0]}of{shard[1]}"
+
+
+def in_shard(key: str, shard: Shard) -> bool:
+    """
+    Check whether a product belongs to a shard.
+
+    Args:
+        key: Product key (``sku_<SKU>`` / ``ean_<EAN>``)
+        shard: Tuple with the shard index and the number of shards
+
+    Returns:
+        True if the product is handled by the shard
+    """
+    return zlib.crc32(key.encode('utf-8')) % shard[1] == shard[0]